@@ -0,0 +1,205 @@
+"""Offline benchmark for the run.py pipeline.
+
+Generates deterministic synthetic payloads in the shape /api/attendance/logs returns, runs each
+pipeline stage on its own and reports wall time and peak traced memory per stage. The HTTP fetch
+is stubbed: fetch_attendance_data runs its real code path against an in-memory response.
+
+    python benchmark.py --employees 10 100 1000 --logs-per-day 2 4
+    python benchmark.py --save-baseline bench_baseline.json
+    python benchmark.py --baseline bench_baseline.json   # exit code 1 on regression
+"""
+import argparse
+import io
+import json
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+import run
+
+STAGES = ["fetch", "process_payload", "map_financial_data", "compute_payroll", "create_pivoted_summary",
+          "create_deductions_table", "populate_attendance_data", "build_streaming_workbook", "save"]
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+# --- Synthetic Data ---
+def synthetic_payload(num_employees: int, logs_per_day: int, year: int, month: int,
+                      history_months: int = 3, seed: int = 42) -> Dict[str, Any]:
+    """Payload with `history_months` of extra history before the target month, formatted the way the
+    backend stores logs (en-IN locale): 'd/m/yyyy' dates and 'h:mm:ss am' times."""
+    rng = random.Random(seed)
+    start = datetime(year, month, 1)
+    for _ in range(history_months): start = (start - timedelta(days=1)).replace(day=1)
+    end = datetime(year + month // 12, month % 12 + 1, 1)
+    days = [start + timedelta(days=i) for i in range((end - start).days)]
+
+    def clock(secs: int) -> str:
+        h, m, s = secs // 3600, secs % 3600 // 60, secs % 60
+        return f"{h % 12 or 12}:{m:02d}:{s:02d} {'am' if h < 12 else 'pm'}"
+
+    data = []
+    for i in range(num_employees):
+        logs = []
+        for dt in days:
+            if rng.random() < 0.1: continue  # absent
+            first_in = rng.randint(8 * 3600, 10 * 3600)
+            last_out = first_in + rng.randint(9 * 3600, 11 * 3600)
+            punches = [(first_in, run.CHECK_IN), (min(last_out, 86399), run.CHECK_OUT)]
+            # Extra punches in between, alternating in/out
+            for k in range(max(0, logs_per_day - 2)):
+                punches.append((rng.randint(first_in, min(last_out, 86399)), run.CHECK_OUT if k % 2 == 0 else run.CHECK_IN))
+            for secs, status in punches:
+                logs.append({"date": f"{dt.day}/{dt.month}/{dt.year}", "time": clock(secs), "status": status,
+                             "day": WEEKDAYS[dt.weekday()]})
+        data.append({"uid": f"EMP{i:05d}", "name": f"Employee {i}", "salary": 12000 + (i % 5) * 1000, "logs": logs})
+    return {"success": True, "count": len(data), "data": data}
+
+
+class StubResponse:
+    status_code = 200
+    headers: Dict[str, str] = {}
+
+    def __init__(self, body: bytes):
+        self.content = body
+
+    def raise_for_status(self): pass
+
+    def json(self): return json.loads(self.content)
+
+
+class StubSession:
+    """Stands in for requests.Session: every GET returns the same in-memory body."""
+    def __init__(self, body: bytes):
+        self.body = body
+
+    def get(self, url, **kwargs): return StubResponse(self.body)
+
+    def __enter__(self): return self
+
+    def __exit__(self, *exc): pass
+
+
+# --- Measurement ---
+def run_pipeline(payload_body: bytes, year: int, month: int, stream: bool, values: bool,
+                 measure: Callable[[str, Callable[[], Any]], Any]) -> Dict[str, int]:
+    """Runs every stage through `measure(stage, fn)` and returns counts for the report."""
+    run.make_session = lambda pool_size=1: StubSession(payload_body)
+    dates = run.get_month_dates(year, month)
+    payload = measure("fetch", lambda: run.fetch_attendance_data("http://benchmark.invalid/logs", use_cache=False))
+    records = measure("process_payload", lambda: run.process_payload(payload, dates))
+    records = measure("map_financial_data", lambda: run.map_financial_data(records))
+    records = measure("compute_payroll", lambda: run.compute_payroll(records, dates))
+    month_name, today = dates[0].strftime("%B"), datetime.now().date()
+
+    if stream:
+        wb = measure("build_streaming_workbook",
+                     lambda: run.build_streaming_workbook(records, dates, month_name, year, today, values))
+    else:
+        from openpyxl import Workbook
+        wb = Workbook()
+        run.register_report_styles(wb)
+        ws = wb.active
+        run.create_report_header(ws, month_name, year)
+        run.create_table_headers(ws, records)
+        num_main_cols, summary_start_col, deductions_start_col = run.report_layout(records)
+        measure("create_pivoted_summary", lambda: run.create_pivoted_summary(ws, records, dates, summary_start_col, values))
+        measure("create_deductions_table", lambda: run.create_deductions_table(ws, records, deductions_start_col, values))
+        measure("populate_attendance_data", lambda: run.populate_attendance_data(ws, records, dates, today, values))
+        run.finalize_styles(ws, num_main_cols)
+    measure("save", lambda: wb.save(io.BytesIO()))
+    return {"employees": len(records), "logs": sum(len(emp["logs"]) for emp in payload["data"])}
+
+
+def benchmark(num_employees: int, logs_per_day: int, year: int, month: int, history_months: int,
+              stream: bool, values: bool, memory: bool) -> Dict[str, Any]:
+    body = json.dumps(synthetic_payload(num_employees, logs_per_day, year, month, history_months)).encode()
+    times, peaks = {}, {}
+
+    def timed(stage, fn):
+        start = time.perf_counter()
+        result = fn()
+        times[stage] = time.perf_counter() - start
+        return result
+
+    def traced(stage, fn):
+        tracemalloc.start()
+        try:
+            return fn()
+        finally:
+            peaks[stage] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    # Separate passes, so tracemalloc's overhead never shows up in the timings
+    counts = run_pipeline(body, year, month, stream, values, timed)
+    if memory: run_pipeline(body, year, month, stream, values, traced)
+    return {"payload_bytes": len(body), **counts,
+            "stages": {stage: {"seconds": times[stage], "peak_bytes": peaks.get(stage)} for stage in times}}
+
+
+# --- Baselines ---
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float, min_seconds: float) -> List[str]:
+    """Stages that got slower (or hungrier) than the baseline by more than `tolerance`."""
+    regressions = []
+    for scenario, result in results.items():
+        for stage, now in result["stages"].items():
+            before = baseline.get(scenario, {}).get("stages", {}).get(stage)
+            if not before: continue
+            if now["seconds"] > before["seconds"] * tolerance and now["seconds"] - before["seconds"] > min_seconds:
+                regressions.append(f"{scenario} {stage}: {before['seconds']:.3f}s -> {now['seconds']:.3f}s")
+            if now["peak_bytes"] and before.get("peak_bytes") and now["peak_bytes"] > before["peak_bytes"] * tolerance:
+                regressions.append(f"{scenario} {stage}: {before['peak_bytes'] / 1e6:.1f}MB -> {now['peak_bytes'] / 1e6:.1f}MB")
+    return regressions
+
+
+def print_results(scenario: str, result: Dict[str, Any]):
+    print(f"\n📊 {scenario}: {result['employees']} employees, {result['logs']} logs, "
+          f"{result['payload_bytes'] / 1e6:.1f} MB payload")
+    for stage in STAGES:
+        if stage not in result["stages"]: continue
+        entry = result["stages"][stage]
+        peak = f"{entry['peak_bytes'] / 1e6:9.1f} MB" if entry["peak_bytes"] is not None else ""
+        print(f"   {stage:<26}{entry['seconds']:9.3f} s {peak}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline per-stage benchmark of run.py")
+    parser.add_argument("--employees", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument("--logs-per-day", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--month", default="2025-10", help="Target month, YYYY-MM")
+    parser.add_argument("--history-months", type=int, default=3, help="Months of extra log history in the payload")
+    parser.add_argument("--stream", action="store_true", help="Benchmark the write-only workbook builder")
+    parser.add_argument("--mode", choices=["formulas", "values"], default="formulas")
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="Skip the tracemalloc pass")
+    parser.add_argument("--save-baseline", metavar="FILE", help="Write the results as a baseline JSON file")
+    parser.add_argument("--baseline", metavar="FILE", help="Compare against a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="Allowed slowdown factor before flagging")
+    parser.add_argument("--min-seconds", type=float, default=0.05, help="Ignore slowdowns smaller than this many seconds")
+    args = parser.parse_args(argv)
+    year, month = map(int, args.month.split("-"))
+
+    results = {}
+    for num_employees in args.employees:
+        for logs_per_day in args.logs_per_day:
+            scenario = f"{num_employees}x{logs_per_day}" + ("-stream" if args.stream else "") + f"-{args.mode}"
+            results[scenario] = benchmark(num_employees, logs_per_day, year, month, args.history_months,
+                                          args.stream, args.mode == "values", args.memory)
+            print_results(scenario, results[scenario])
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f: json.dump(results, f, indent=2)
+        print(f"\n💾 Baseline saved as '{args.save_baseline}'")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f: baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance, args.min_seconds)
+        for line in regressions: print(f"❌ [Regression] {line}")
+        if regressions: return 1
+        print("\n✅ No regressions against the baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,40 @@
-import requests
-import pandas as pd
-from datetime import datetime, date, time
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-from openpyxl.utils import get_column_letter
-from typing import List, Dict, Any, Optional
+from __future__ import annotations
+
+import argparse
+import calendar
+import csv
+import hashlib
+import io
+import json
+import math
+import os
+import re
+import threading
+import time as timer
+from collections import OrderedDict
+from urllib.parse import parse_qs, quote, urlparse
+import numpy as np
+from datetime import MAXYEAR, MINYEAR, datetime, date, time, timedelta
+from contextlib import closing, contextmanager
+from functools import lru_cache
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+
+# requests, openpyxl and pandas, and the modules only some modes need (process pools, sqlite3, http.server,
+# mmap, cProfile / tracemalloc), are imported inside the functions that use them, so that a run doesn't
+# pay for importing what its mode never touches.
 
 # --- Constants for Configuration & Styling ---
 
 # API Configuration
 API_URL = "https://shreejiattendance.run.place/api/attendance/logs"
 API_TIMEOUT = 15  # seconds
+FETCH_WORKERS = 8  # Concurrent requests when fetching per employee
+FETCH_RETRIES = 4  # Retries per request on connection errors / 429 / 5xx
+FETCH_BACKOFF = 0.5  # seconds; doubled after every retry
+CACHE_DIR = ".attendance_cache" # Last good payload per (URL, token), revalidated with ETag/Last-Modified
+STORE_SUFFIX = ".daily.sqlite3" # Per-day results per URL in CACHE_DIR, for --refresh
+SERVE_REFRESH_SECONDS = 300 # How often --serve re-fetches the logs in the background
+REPORT_CACHE_SIZE = 16 # Generated workbooks --serve keeps in memory
 
 # --- ADD SECRETS HERE ---
 # These must match the secrets on your ESP32 device
@@ -22,6 +46,10 @@ OUTPUT_FILENAME = "Pivoted_Attendance_Report_with_Salary.xlsx"
 COMPANY_NAME = "Shreeji Remedies"
 REPORT_TITLE = "Monthly Attendance & Salary Report"
 FULL_DAY_HOURS = 10.5 # Define how many hours constitute a full working day
+RELIEF_MINUTES = 30 # A weekday short by at most this many minutes still counts as a full day
+
+# Log status values as sent by the ESP32 device
+CHECK_IN, CHECK_OUT = "Check-IN", "Check-OUT"
 
 # --- Define Employee Financial Data ---
 # Use employee 'uid' as the key. 'default' is a fallback value.
@@ -36,41 +64,87 @@ EMPLOYEE_PREMIUMS = {'default': 0}
 
 # --- STYLES ---
 
-# Fills
-HEADER_FILL = PatternFill(start_color="2C3E50", end_color="2C3E50", fill_type="solid") # Dark Slate Blue
-SUBHEADER_FILL = PatternFill(start_color="34495E", end_color="34495E", fill_type="solid") # Lighter Slate Blue
-CI_HEADER_FILL = PatternFill(start_color="D5F5E3", end_color="D5F5E3", fill_type="solid") # Light Green
-CO_HEADER_FILL = PatternFill(start_color="FADBD8", end_color="FADBD8", fill_type="solid") # Light Red
-MINS_HEADER_FILL = PatternFill(start_color="D6EAF8", end_color="D6EAF8", fill_type="solid") # Light Blue
-SUNDAY_FILL = PatternFill(start_color="FFE5E5", end_color="FFE5E5", fill_type="solid") # Light Red for Sunday
-TODAY_FILL = PatternFill(start_color="FCF3CF", end_color="FCF3CF", fill_type="solid") # Light Yellow
-ALT_COL_FILL = PatternFill(start_color="ECF0F1", end_color="ECF0F1", fill_type="solid") # Light Grey/Blue for columns
-FINANCIAL_HEADER_FILL = PatternFill(start_color="F39C12", end_color="F39C12", fill_type="solid") # Orange for Financial Summary
-DEDUCTIONS_HEADER_FILL = PatternFill(start_color="27AE60", end_color="27AE60", fill_type="solid") # Green for Deductions
-# New styles from image
-NAME_CELL_FILL = PatternFill(start_color="F5B7B1", end_color="F5B7B1", fill_type="solid") # Light Red/Orange
-IN_HAND_SALARY_FILL = PatternFill(start_color="A9DFBF", end_color="A9DFBF", fill_type="solid") # Muted Green
-
-# Fonts
-HEADER_FONT = Font(name="Calibri", size=18, bold=True, color="FFFFFF")
-SUBTITLE_FONT = Font(name="Calibri", size=11, italic=True, color="FFFFFF")
-TABLE_HEADER_FONT = Font(name="Calibri", size=11, bold=True, color="FFFFFF")
-SUNDAY_DATE_FONT = Font(name="Calibri", size=11, bold=True, color="943126") # Dark Red
-TODAY_DATE_FONT = Font(name="Calibri", size=11, bold=True, color="B7950B") # Dark Yellow/Gold
-CI_FONT = Font(name="Calibri", color="287431", bold=True) # Dark Green
-CO_FONT = Font(name="Calibri", color="943126", bold=True) # Dark Red
-MINS_FONT = Font(name="Calibri", color="1B4F72", bold=True) # Dark Blue
-DATA_FONT = Font(name="Calibri", size=11)
-CI_DATA_FONT = Font(name="Calibri", size=11, color="287431")
-CO_DATA_FONT = Font(name="Calibri", size=11, color="943126")
-IN_HAND_SALARY_HEADER_FONT = Font(name="Calibri", size=11, bold=True, color="145A32") # Dark Green for contrast
-
-# Borders
-THIN_BORDER_SIDE = Side(style="thin", color="BDC3C7") # Grey
-THIN_BORDER = Border(left=THIN_BORDER_SIDE, right=THIN_BORDER_SIDE, top=THIN_BORDER_SIDE, bottom=THIN_BORDER_SIDE)
-
-# Alignment
-CENTER_ALIGN = Alignment(horizontal="center", vertical="center", wrap_text=True)
+# Number Formats
+TIME_FORMAT = 'h:mm:ss AM/PM'
+MINUTES_FORMAT = '#,##0.00'
+CURRENCY_FORMAT = '"₹"#,##0.00'
+WAGE_FORMAT = '"₹"#,##0.0000'
+
+@lru_cache(maxsize=None)
+def report_styles() -> Dict[str, tuple]:
+    """The report's whole visual vocabulary: name -> (font, alignment, fill, border, number_format).
+    Registered once per workbook so each cell only references a style by name. Built on first use,
+    so runs that never write a workbook don't import openpyxl."""
+    from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+
+    # Fills
+    header_fill = PatternFill(start_color="2C3E50", end_color="2C3E50", fill_type="solid") # Dark Slate Blue
+    subheader_fill = PatternFill(start_color="34495E", end_color="34495E", fill_type="solid") # Lighter Slate Blue
+    ci_header_fill = PatternFill(start_color="D5F5E3", end_color="D5F5E3", fill_type="solid") # Light Green
+    co_header_fill = PatternFill(start_color="FADBD8", end_color="FADBD8", fill_type="solid") # Light Red
+    mins_header_fill = PatternFill(start_color="D6EAF8", end_color="D6EAF8", fill_type="solid") # Light Blue
+    sunday_fill = PatternFill(start_color="FFE5E5", end_color="FFE5E5", fill_type="solid") # Light Red for Sunday
+    today_fill = PatternFill(start_color="FCF3CF", end_color="FCF3CF", fill_type="solid") # Light Yellow
+    alt_col_fill = PatternFill(start_color="ECF0F1", end_color="ECF0F1", fill_type="solid") # Light Grey/Blue for columns
+    financial_header_fill = PatternFill(start_color="F39C12", end_color="F39C12", fill_type="solid") # Orange for Financial Summary
+    deductions_header_fill = PatternFill(start_color="27AE60", end_color="27AE60", fill_type="solid") # Green for Deductions
+    # New styles from image
+    name_cell_fill = PatternFill(start_color="F5B7B1", end_color="F5B7B1", fill_type="solid") # Light Red/Orange
+    in_hand_salary_fill = PatternFill(start_color="A9DFBF", end_color="A9DFBF", fill_type="solid") # Muted Green
+
+    # Fonts
+    header_font = Font(name="Calibri", size=18, bold=True, color="FFFFFF")
+    subtitle_font = Font(name="Calibri", size=11, italic=True, color="FFFFFF")
+    table_header_font = Font(name="Calibri", size=11, bold=True, color="FFFFFF")
+    sunday_date_font = Font(name="Calibri", size=11, bold=True, color="943126") # Dark Red
+    today_date_font = Font(name="Calibri", size=11, bold=True, color="B7950B") # Dark Yellow/Gold
+    ci_font = Font(name="Calibri", color="287431", bold=True) # Dark Green
+    co_font = Font(name="Calibri", color="943126", bold=True) # Dark Red
+    mins_font = Font(name="Calibri", color="1B4F72", bold=True) # Dark Blue
+    data_font = Font(name="Calibri", size=11)
+    ci_data_font = Font(name="Calibri", size=11, color="287431")
+    co_data_font = Font(name="Calibri", size=11, color="943126")
+    in_hand_salary_header_font = Font(name="Calibri", size=11, bold=True, color="145A32") # Dark Green for contrast
+
+    # Borders
+    thin_border_side = Side(style="thin", color="BDC3C7") # Grey
+    thin_border = Border(left=thin_border_side, right=thin_border_side, top=thin_border_side, bottom=thin_border_side)
+
+    # Alignment
+    center_align = Alignment(horizontal="center", vertical="center", wrap_text=True)
+    right_align = Alignment(horizontal="right")
+
+    # Named styles
+    styles = {
+        "Report Title": (header_font, center_align, header_fill, None, None),
+        "Report Subtitle": (subtitle_font, center_align, header_fill, None, None),
+        "Financial Title": (header_font, center_align, financial_header_fill, None, None),
+        "Deductions Title": (header_font, center_align, deductions_header_fill, None, None),
+        "Table Header": (table_header_font, center_align, subheader_fill, thin_border, None),
+        "Summary Header": (table_header_font, right_align, subheader_fill, thin_border, None),
+        "In Hand Salary Header": (in_hand_salary_header_font, right_align, in_hand_salary_fill, thin_border, None),
+        "Date": (data_font, center_align, None, thin_border, None),
+        "Sunday Date": (sunday_date_font, center_align, sunday_fill, thin_border, None),
+        "Today Date": (today_date_font, center_align, today_fill, thin_border, None),
+        "Check-In Label": (ci_font, center_align, ci_header_fill, thin_border, None),
+        "Check-Out Label": (co_font, center_align, co_header_fill, thin_border, None),
+        "Minutes Label": (mins_font, center_align, mins_header_fill, thin_border, None),
+        "Data": (data_font, center_align, None, thin_border, None),
+        "Amount": (data_font, center_align, None, thin_border, CURRENCY_FORMAT),
+        "Wage": (data_font, center_align, None, thin_border, WAGE_FORMAT),
+        "Minutes": (data_font, center_align, None, thin_border, MINUTES_FORMAT),
+        "Employee Name": (data_font, center_align, name_cell_fill, thin_border, None),
+        "In Hand Salary": (data_font, center_align, in_hand_salary_fill, thin_border, CURRENCY_FORMAT),
+    }
+    # Daily CI/CO/minutes cells, each with a shaded twin for alternating employee columns
+    styles.update({
+        name + suffix: (font, center_align, fill, thin_border, number_format)
+        for name, font, number_format in [("CI Data", ci_data_font, None), ("CI Time", ci_data_font, TIME_FORMAT),
+                                          ("CO Data", co_data_font, None), ("CO Time", co_data_font, TIME_FORMAT),
+                                          ("Minutes Data", data_font, MINUTES_FORMAT)]
+        for suffix, fill in [("", None), (" Alt", alt_col_fill)]
+    })
+    return styles
 
 # --- Token Generation ---
 def generate_auth_token(esp_secret: str, server_secret: str) -> str:
@@ -80,282 +154,910 @@ def generate_auth_token(esp_secret: str, server_secret: str) -> str:
     token_parts = [f'{(ord(e) ^ ord(server_secret[i % len(server_secret)])):02x}' for i, e in enumerate(esp_secret)]
     return "".join(token_parts)
 
+# --- Payload Cache ---
+def cache_paths(url: str, token: str) -> (str, str):
+    """(body, metadata) file paths of the cached payload for this URL and auth token."""
+    key = hashlib.sha256(f"{url}\n{token}".encode()).hexdigest()[:32]
+    return os.path.join(CACHE_DIR, f"{key}.json"), os.path.join(CACHE_DIR, f"{key}.meta.json")
+
+def load_cache_meta(url: str, token: str) -> Optional[Dict[str, Any]]:
+    """Metadata of the cached snapshot, or None when there is no complete snapshot on disk."""
+    body_path, meta_path = cache_paths(url, token)
+    try:
+        with open(meta_path, encoding="utf-8") as f: meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if os.path.exists(body_path) else None
+
+def load_cached_payload(url: str, token: str) -> Optional[Dict[str, Any]]:
+    """The cached snapshot's payload, or None when it is missing or unreadable. Only read when the
+    snapshot is actually used, so a run that gets a fresh 200 never parses the stale copy."""
+    try:
+        with open(cache_paths(url, token)[0], "rb") as f: return json.loads(f.read())
+    except (OSError, ValueError) as e:
+        print(f"❌ [Cache] The cached snapshot is unreadable ({e}).")
+        return None
+
+def save_cache_meta(url: str, token: str, response_headers) -> None:
+    meta = {"url": url, "etag": response_headers.get("ETag"), "last_modified": response_headers.get("Last-Modified"),
+            "fetched_at": datetime.now().isoformat(timespec="seconds")}
+    meta_path = cache_paths(url, token)[1]
+    with open(meta_path + ".tmp", "w", encoding="utf-8") as f: json.dump(meta, f)
+    os.replace(meta_path + ".tmp", meta_path)
+
+def save_cached_payload(url: str, token: str, body: bytes, response_headers) -> None:
+    body_path = cache_paths(url, token)[0]
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # Write to temp files first so an interrupted run never leaves a half-written snapshot
+        with open(body_path + ".tmp", "wb") as f: f.write(body)
+        os.replace(body_path + ".tmp", body_path)
+        save_cache_meta(url, token, response_headers)
+    except OSError as e:
+        print(f"⚠️ [Cache] Could not write cache: {e}")
+
+def request_headers(token: str, meta: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    """Auth header plus conditional-request headers when a cached snapshot can be revalidated."""
+    headers = {'x-esp32-token': token} if token else {}
+    if token: print(f"🔐 [Auth] Using token: {token}")
+    if meta:
+        if meta.get("etag"): headers['If-None-Match'] = meta["etag"]
+        if meta.get("last_modified"): headers['If-Modified-Since'] = meta["last_modified"]
+    return headers
+
+class TeeReader:
+    """Read-through wrapper around a response stream that copies every chunk handed out into `sink`."""
+    def __init__(self, source, sink=None):
+        self.source, self.sink = source, sink
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.source.read(size)
+        if self.sink is not None and chunk: self.sink.write(chunk)
+        return chunk
+
+    def drain(self, chunk_size: int = 1 << 16):
+        while self.read(chunk_size): pass
+
+# --- Run Metrics ---
+class RunProfiler:
+    """Opt-in stage instrumentation. Each stage appends one JSON line to the metrics file with its wall
+    and CPU seconds, tracemalloc peak and whatever counts were reported while it ran. While disabled,
+    stage() and count() do nothing."""
+    def __init__(self):
+        self.enabled, self.path, self.context, self.current = False, None, {}, None
+
+    def start(self, path: str, run: Optional[str] = None, **context):
+        self.enabled, self.path, self.current = True, path, None
+        self.context = {"run": run or f"{datetime.now():%Y%m%dT%H%M%S}-{os.getpid()}", **context}
+        self.started, self.cpu_started, self.peak = timer.perf_counter(), timer.process_time(), 0
+        import tracemalloc
+        if not tracemalloc.is_tracing(): tracemalloc.start()
+
+    def child_settings(self) -> Optional[Dict[str, Any]]:
+        """What a worker process needs to append its own stages to the same run."""
+        return {"path": self.path, **self.context} if self.enabled else None
+
+    @contextmanager
+    def stage(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        import tracemalloc
+        self.current = {}
+        tracemalloc.reset_peak()
+        wall, cpu = timer.perf_counter(), timer.process_time()
+        try:
+            yield
+        finally:
+            peak = tracemalloc.get_traced_memory()[1]
+            self.peak = max(self.peak, peak)
+            self.write(name, timer.perf_counter() - wall, timer.process_time() - cpu, peak, self.current)
+            self.current = None
+
+    def count(self, **counts: int):
+        if self.current is None: return
+        for key, value in counts.items(): self.current[key] = self.current.get(key, 0) + int(value)
+
+    def tally_cells(self, values: Iterable):
+        """Counts the non-empty values (and the formulas among them) written to a sheet."""
+        if self.current is None: return
+        cells = formulas = 0
+        for value in values:
+            if value is None: continue
+            cells += 1
+            if isinstance(value, str) and value.startswith("="): formulas += 1
+        self.count(cells=cells, formulas=formulas)
+
+    def finish(self, ok: bool = True):
+        if not self.enabled: return
+        import tracemalloc
+        self.write("total", timer.perf_counter() - self.started, timer.process_time() - self.cpu_started, self.peak, {"ok": ok})
+        tracemalloc.stop()
+        self.enabled = False
+        print(f"📈 [Profile] Stage metrics appended to '{self.path}'")
+
+    def write(self, stage: str, wall: float, cpu: float, peak: int, extra: Dict[str, Any]):
+        record = {**self.context, "pid": os.getpid(), "stage": stage, "wall_s": round(wall, 6),
+                  "cpu_s": round(cpu, 6), "peak_bytes": peak, **extra}
+        # One short append per line, so worker processes can share the file
+        with open(self.path, "a", encoding="utf-8") as f: f.write(json.dumps(record) + "\n")
+
+PROFILE = RunProfiler()
+
+def payload_counts(payload: Dict[str, Any]) -> Dict[str, int]:
+    employees = payload.get('data', [])
+    return {"employees": len(employees), "logs": sum(len(emp.get('logs', [])) for emp in employees)}
+
 # --- API Data Fetching ---
-def fetch_attendance_data(url: str) -> Dict[str, Any]:
+def make_session(pool_size: int = 1) -> "requests.Session":
+    """Session with a connection pool of `pool_size` and retries with exponential backoff."""
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    retry = Retry(total=FETCH_RETRIES, backoff_factor=FETCH_BACKOFF, status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=frozenset(["GET"]))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def fetch_attendance_data(url: str, use_cache: bool = True, offline: bool = False) -> Dict[str, Any]:
+    token = generate_auth_token(ESP_SECRET, SERVER_SECRET)
+    meta = load_cache_meta(url, token) if use_cache or offline else None
+
+    if offline:
+        if meta is None:
+            print("❌ [Cache] Offline mode but no snapshot is cached for this URL. Continuing with an empty dataset.")
+            return {'data': []}
+        print(f"📦 [Cache] Offline: using snapshot from {meta.get('fetched_at')}")
+        cached = load_cached_payload(url, token)
+        if cached is None: print("❌ [Cache] Offline mode and no usable snapshot. Continuing with an empty dataset.")
+        return cached if cached is not None else {'data': []}
+
+    import requests
     try:
-        token = generate_auth_token(ESP_SECRET, SERVER_SECRET)
-        headers = {'x-esp32-token': token} if token else {}
-        if token: print(f"🔐 [Auth] Using token: {token}")
-        response = requests.get(url, headers=headers, timeout=API_TIMEOUT)
+        with make_session() as session:
+            response = session.get(url, headers=request_headers(token, meta), timeout=API_TIMEOUT)
+        if response.status_code == 304 and meta is not None:
+            print(f"📦 [Cache] Not modified since {meta.get('fetched_at')}, using cached payload.")
+            cached = load_cached_payload(url, token)
+            if cached is not None: return cached
+            # Forget the broken snapshot, so the retry is an unconditional request that replaces it
+            os.remove(cache_paths(url, token)[1])
+            return fetch_attendance_data(url, use_cache, offline)
         response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
+        payload = response.json()
+        if use_cache: save_cached_payload(url, token, response.content, response.headers)
+        return payload
+    except (requests.exceptions.RequestException, ValueError) as e:
+        cached = load_cached_payload(url, token) if meta is not None else None
+        if cached is not None:
+            print(f"Error fetching data from API: {e}\n⚠️ [Cache] Serving stale snapshot from {meta.get('fetched_at')}.")
+            return cached
         print(f"Error fetching data from API: {e}\nContinuing with an empty dataset.")
         return {'data': []}
 
+def fetch_attendance_by_employee(url: str, year: int, month: int, workers: int = FETCH_WORKERS,
+                                 use_cache: bool = True, offline: bool = False) -> Dict[str, Any]:
+    """Builds the same payload as `url` (the /logs endpoint) from the per-employee, month-filtered
+    /employees/:uid/logs endpoint, with up to `workers` requests in flight over one pooled session.
+    Results are assembled in the order of the /employees listing. Falls back to fetch_attendance_data
+    if any request still fails after its retries. Per-employee responses are not cached, so offline
+    runs are served from the cached full payload."""
+    if offline:
+        print("📦 [Cache] Offline: per-employee fetch uses the cached full payload.")
+        return fetch_attendance_data(url, use_cache=use_cache, offline=True)
+
+    import requests
+    from concurrent.futures import ThreadPoolExecutor
+
+    base_url = url.rsplit("/", 1)[0]
+    token = generate_auth_token(ESP_SECRET, SERVER_SECRET)
+    headers = request_headers(token, None)
+
+    def fetch_logs(session: requests.Session, uid: str) -> List[Dict[str, Any]]:
+        response = session.get(f"{base_url}/employees/{quote(str(uid), safe='')}/logs", headers=headers,
+                               params={"month": month, "year": year}, timeout=API_TIMEOUT)
+        response.raise_for_status()
+        return response.json().get("logs", [])
+
+    try:
+        with make_session(workers) as session:
+            response = session.get(f"{base_url}/employees", headers=headers, timeout=API_TIMEOUT)
+            response.raise_for_status()
+            employees = response.json()
+            if not isinstance(employees, list): raise ValueError(f"unexpected /employees response: {type(employees).__name__}")
+            # pool.map yields results in submission order, however the requests complete
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                logs = list(pool.map(lambda emp: fetch_logs(session, emp.get("uid")), employees))
+    except (requests.exceptions.RequestException, ValueError) as e:
+        print(f"Error fetching per-employee logs: {e}\nFalling back to a single full fetch.")
+        return fetch_attendance_data(url, use_cache=use_cache, offline=offline)
+
+    print(f"📥 [Fetch] {len(employees)} employees, {sum(map(len, logs))} logs in {month:02d}/{year}.")
+    return {'data': [{"uid": emp.get("uid"), "name": emp.get("name"), "logs": emp_logs} for emp, emp_logs in zip(employees, logs)]}
+
+def ingest_attendance_data(url: str, dates: List[datetime], use_cache: bool = True, offline: bool = False) -> List[EmployeeMonth]:
+    """Streaming counterpart of process_payload(fetch_attendance_data(...)): the response body is parsed
+    incrementally as it arrives (and copied into the cache on the way), never loaded as a whole."""
+    try:
+        import ijson
+    except ImportError:
+        print("⚠️ [Ingest] ijson is not installed; falling back to response.json().")
+        return process_payload(fetch_attendance_data(url, use_cache, offline), dates)
+
+    token = generate_auth_token(ESP_SECRET, SERVER_SECRET)
+    meta = load_cache_meta(url, token) if use_cache or offline else None
+    body_path = cache_paths(url, token)[0]
+
+    def from_snapshot(note: str) -> Optional[List[EmployeeMonth]]:
+        """The cached snapshot's records, or None if it is truncated or unreadable."""
+        print(f"📦 [Cache] {note} {meta.get('fetched_at')}")
+        try:
+            with open(body_path, "rb") as f: return process_payload_stream(f, dates)
+        except (OSError, ValueError) as e:
+            print(f"❌ [Cache] The cached snapshot is unreadable ({e}).")
+            return None
+
+    def empty(note: str) -> List[EmployeeMonth]:
+        print(f"{note} Continuing with an empty dataset." if note else "Continuing with an empty dataset.")
+        return process_payload({'data': []}, dates)
+
+    if offline:
+        if meta is None: return empty("❌ [Cache] Offline mode but no snapshot is cached for this URL.")
+        records = from_snapshot("Offline: using snapshot from")
+        return records if records is not None else empty("❌ [Cache] Offline mode and no usable snapshot.")
+
+    import requests, urllib3
+    sink = None
+    try:
+        session = make_session()
+        response = session.get(url, headers=request_headers(token, meta), timeout=API_TIMEOUT, stream=True)
+        with session, response:
+            if response.status_code == 304 and meta is not None:
+                records = from_snapshot("Not modified since")
+                if records is not None: return records
+                # Forget the broken snapshot, so the retry is an unconditional request that replaces it
+                os.remove(cache_paths(url, token)[1])
+                return ingest_attendance_data(url, dates, use_cache, offline)
+            response.raise_for_status()
+            response.raw.decode_content = True
+            if use_cache:
+                os.makedirs(CACHE_DIR, exist_ok=True)
+                sink = open(body_path + ".tmp", "wb")
+            body = TeeReader(response.raw, sink)
+            records = process_payload_stream(body, dates)
+            body.drain()
+        if sink is not None:
+            sink.close()
+            os.replace(body_path + ".tmp", body_path)
+            save_cache_meta(url, token, response.headers)
+        return records
+    except (requests.exceptions.RequestException, urllib3.exceptions.HTTPError, ijson.JSONError, OSError, ValueError) as e:
+        if sink is not None:
+            sink.close()
+            os.remove(body_path + ".tmp")
+        print(f"Error fetching data from API: {e}")
+        records = from_snapshot("Serving stale snapshot from") if meta is not None else None
+        return records if records is not None else empty("")
+
+# --- Log Archives ---
+ARCHIVE_LOGS_KEY = re.compile(rb'"logs"\s*:\s*\[')
+
+def archive_date_pattern(suffixes: set) -> "re.Pattern":
+    """Matches the "date" field of a log whose dd/mm/yyyy string ends in one of `suffixes`."""
+    endings = b"|".join(re.escape(suffix.encode()) for suffix in sorted(suffixes))
+    return re.compile(rb'"date"\s*:\s*"\d{1,2}(?:' + endings + rb')"')
+
+def archive_line_employee(line: bytes, suffixes: Optional[set], date_pattern: Optional["re.Pattern"]) -> Dict[str, Any]:
+    """Decodes one employee document of an NDJSON dump, keeping the logs whose date ends in one of `suffixes`.
+    The logs are flat {date, time, status, day} objects, so instead of decoding a whole multi-year history,
+    the matching "date" fields are found in the raw bytes and only their enclosing objects are decoded; the
+    rest of the document is decoded with the logs array cut out. Falls back to a full decode if the cut
+    does not yield valid JSON."""
+    logs_key = ARCHIVE_LOGS_KEY.search(line) if date_pattern is not None else None
+    if logs_key:
+        start = logs_key.end() - 1
+        end = line.find(b"]", start)
+        try:
+            doc = json.loads(line[:start] + b"[]" + line[end + 1:])
+            logs = [json.loads(line[line.rfind(b"{", start, match.start()):line.find(b"}", match.end()) + 1])
+                    for match in date_pattern.finditer(line, start, end)]
+        except ValueError:
+            logs_key = None
+    if not logs_key:
+        doc = json.loads(line)
+        logs = [log for log in doc.get("logs") or [] if suffixes is None or
+                isinstance(log.get("date"), str) and log["date"][log["date"].find("/"):] in suffixes]
+    return {"uid": doc.get("uid", "N/A"), "name": doc.get("name", "Unknown"), "logs": logs}
+
+def ndjson_employees(mm: "mmap.mmap", suffixes: Optional[set], date_pattern: Optional["re.Pattern"]) -> Iterator[Dict[str, Any]]:
+    """Employees of a dump with one document per line, taken straight from the mapped pages one line at a time."""
+    pos, line_no = 0, 0
+    while pos < len(mm):
+        end = mm.find(b"\n", pos)
+        if end < 0: end = len(mm)
+        line, pos, line_no = mm[pos:end], end + 1, line_no + 1
+        if not line.strip(): continue
+        try:
+            yield archive_line_employee(line, suffixes, date_pattern)
+        except ValueError as e:
+            raise ValueError(f"line {line_no} is not a JSON document ({e})") from e
+
+def read_log_archive(path: str, dates: Optional[List[datetime]] = None) -> Optional[Dict[str, Any]]:
+    """Payload in the shape fetch_attendance_data returns, read from a mongoexport dump of the Employee
+    collection instead of the API, with only the logs that fall on one of `dates` (all logs when None).
+    The file is memory-mapped. NDJSON dumps (mongoexport's default) are scanned one document per line;
+    --jsonArray and --pretty dumps are streamed with ijson. Memory is bounded by the selected logs, not
+    the file size. Returns None if the file can't be read."""
+    import mmap
+    suffixes = month_date_suffixes(dates) if dates else None
+    date_pattern = archive_date_pattern(suffixes) if suffixes else None
+    employees = []
+    try:
+        if os.path.getsize(path) == 0: return {'data': []}
+        with open(path, "rb") as f, closing(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)) as mm:
+            if hasattr(mm, "madvise"): mm.madvise(mmap.MADV_SEQUENTIAL)
+            if mm[:4096].lstrip()[:1] == b"[":
+                employees.extend(stream_employees(mm, suffixes, root='item'))
+            else:
+                try:
+                    employees.extend(ndjson_employees(mm, suffixes, date_pattern))
+                except ValueError:
+                    if employees: raise
+                    # Not one document per line from the start: documents spread over several lines (--pretty)
+                    employees.extend(stream_employees(mm, suffixes, root=''))
+    except (OSError, ValueError) as e:
+        print(f"❌ Error reading archive '{path}': {e}")
+        return None
+    print(f"📂 [Archive] {len(employees)} employees, {sum(len(emp['logs']) for emp in employees)} logs selected from '{path}'.")
+    return {'data': employees}
+
 # --- Data Processing ---
+class EmployeeMonth:
+    """One employee's month. check_ins / check_outs hold a per-day array of seconds since midnight
+    (NaN = no punch); map_financial_data and compute_payroll fill in the financial fields."""
+    __slots__ = ("uid", "name", "check_ins", "check_outs", "monthly_salary", "allowance", "advance_paid", "loan",
+                 "premium", "minutes", "presence", "absence", "total_days", "payable_days", "per_day_amt",
+                 "per_min_wage", "total_mins", "gross_salary", "short_hour_deduct", "earned_salary",
+                 "total_deductions", "in_hand_salary")
+
+    def __init__(self, uid, name, check_ins: np.ndarray, check_outs: np.ndarray):
+        self.uid, self.name, self.check_ins, self.check_outs = uid, name, check_ins, check_outs
+
 def get_month_dates(year: int, month: int) -> List[datetime]:
     try:
         start_date = datetime(year, month, 1)
-        days_in_month = pd.Period(f'{year}-{month}').days_in_month
-        return [start_date + pd.Timedelta(days=i) for i in range(days_in_month)]
+        return [start_date + timedelta(days=i) for i in range(calendar.monthrange(year, month)[1])]
     except ValueError:
         print(f"❌ Invalid year ({year}) or month ({month}). Exiting.")
         return []
 
-def process_payload(payload: Dict[str, Any], dates: List[datetime]) -> pd.DataFrame:
-    attendance_list = []
-    for emp in payload.get('data', []):
-        log_map = {dt.date(): [] for dt in dates}
+def build_log_table(payload: Dict[str, Any], dates: List[datetime]) -> Dict[str, np.ndarray]:
+    """Flattens every raw log into one columnar table (emp, day, secs, status) restricted to `dates`."""
+    emp_idx, date_strs, time_strs, statuses = [], [], [], []
+    for i, emp in enumerate(payload.get('data', [])):
         for log in emp.get('logs', []):
-            try:
-                log_date = datetime.strptime(log['date'], "%d/%m/%Y").date()
-                if log_date in log_map:
-                    log_map[log_date].append(log)
-            except (ValueError, KeyError):
-                continue
-        row = {"No.": emp.get("uid", "N/A"), "Name": emp.get("name", "Unknown"), **log_map}
-        attendance_list.append(row)
-    df = pd.DataFrame(attendance_list)
-    return df if df.empty else df.sort_values(by="No.")
+            emp_idx.append(i)
+            date_strs.append(log.get('date'))
+            time_strs.append(log.get('time'))
+            statuses.append(log.get('status'))
+    return log_table_from_columns(emp_idx, date_strs, time_strs, statuses, dates)
+
+EPOCH = datetime(1970, 1, 1)
+LOG_STATUS_CODES = {CHECK_IN: 1, CHECK_OUT: 2} # Any other status is 0 and ignored
+
+def parse_log_date(value) -> float:
+    try:
+        return float((datetime.strptime(value, "%d/%m/%Y") - EPOCH).days)
+    except (TypeError, ValueError):
+        return np.nan
+
+def parse_log_time(value) -> float:
+    try:
+        parsed = datetime.strptime(value.strip(), "%I:%M:%S %p")
+    except (AttributeError, ValueError):
+        return np.nan
+    return float(parsed.hour * 3600 + parsed.minute * 60 + parsed.second)
+
+def parse_log_columns(date_strs, time_strs) -> (np.ndarray, np.ndarray):
+    """Raw 'd/m/yyyy' dates and 'h:mm:ss am' times as days since 1970-01-01 and seconds since midnight
+    (NaN where unparseable)."""
+    # Dates and times repeat heavily across employees, so parse each distinct string only once
+    parsed_dates, parsed_times = {}, {}
+
+    def lookup(parsed: dict, parse, value) -> float:
+        if not isinstance(value, str): return np.nan
+        if value not in parsed: parsed[value] = parse(value)
+        return parsed[value]
 
-def map_financial_data(df: pd.DataFrame) -> pd.DataFrame:
+    days = np.fromiter((lookup(parsed_dates, parse_log_date, v) for v in date_strs), dtype="float64", count=len(date_strs))
+    secs = np.fromiter((lookup(parsed_times, parse_log_time, v) for v in time_strs), dtype="float64", count=len(time_strs))
+    return days, secs
+
+def log_table_from_columns(emp_idx: List[int], date_strs: List[str], time_strs: List[str], statuses: List[str],
+                           dates: List[datetime]) -> Dict[str, np.ndarray]:
+    """Parses the raw log columns in bulk and keeps the rows that fall on one of `dates`, as 'emp', 'day',
+    'secs' and 'status' (LOG_STATUS_CODES) arrays."""
+    if not emp_idx or not dates:
+        return {"emp": np.empty(0, dtype="int64"), "day": np.empty(0, dtype="int64"), "secs": np.empty(0), "status": np.empty(0, dtype="int8")}
+
+    days, secs = parse_log_columns(date_strs, time_strs)
+    day = days - (dates[0] - EPOCH).days
+    status = np.fromiter((LOG_STATUS_CODES.get(s, 0) if isinstance(s, str) else 0 for s in statuses), dtype="int8", count=len(statuses))
+    in_month = (day >= 0) & (day < len(dates)) & ~np.isnan(secs)
+    return {"emp": np.array(emp_idx, dtype="int64")[in_month], "day": day[in_month].astype("int64"),
+            "secs": secs[in_month], "status": status[in_month]}
+
+def aggregate_logs(logs: Dict[str, np.ndarray], num_emps: int, num_days: int) -> (np.ndarray, np.ndarray):
+    """Earliest check-in and latest check-out per (employee, day) as seconds since midnight (NaN = none)."""
+    first_in = np.full(num_emps * num_days, np.inf)
+    last_out = np.full(num_emps * num_days, -np.inf)
+    flat = logs["emp"] * num_days + logs["day"]
+    secs = logs["secs"]
+    is_in, is_out = logs["status"] == LOG_STATUS_CODES[CHECK_IN], logs["status"] == LOG_STATUS_CODES[CHECK_OUT]
+    np.minimum.at(first_in, flat[is_in], secs[is_in])
+    np.maximum.at(last_out, flat[is_out], secs[is_out])
+    first_in[np.isinf(first_in)], last_out[np.isinf(last_out)] = np.nan, np.nan
+    return first_in.reshape(num_emps, num_days), last_out.reshape(num_emps, num_days)
+
+def attendance_records(employees: List[Dict[str, Any]], logs: Dict[str, np.ndarray], dates: List[datetime]) -> List[EmployeeMonth]:
+    return employee_records(employees, *aggregate_logs(logs, len(employees), len(dates)))
+
+def employee_records(employees: List[Dict[str, Any]], first_in: np.ndarray, last_out: np.ndarray) -> List[EmployeeMonth]:
+    """One record per employee, sorted by uid; the day arrays are rows of the (employees x days) matrices."""
+    records = [EmployeeMonth(emp.get("uid", "N/A"), emp.get("name", "Unknown"), first_in[i], last_out[i])
+               for i, emp in enumerate(employees)]
+    return sorted(records, key=lambda rec: (rec.uid is None, rec.uid))
+
+def process_payload(payload: Dict[str, Any], dates: List[datetime]) -> List[EmployeeMonth]:
+    return attendance_records(payload.get('data', []), build_log_table(payload, dates), dates)
+
+def month_date_suffixes(dates: List[datetime]) -> set:
+    """'/m/yyyy' and '/mm/yyyy' endings of every dd/mm/yyyy string that can fall on one of `dates`."""
+    return {suffix for dt in dates for suffix in (f"/{dt.month}/{dt.year}", f"/{dt.month:02d}/{dt.year}")}
+
+def stream_employees(fp, suffixes: Optional[set] = None, root: str = 'data.item') -> Iterator[Dict[str, Any]]:
+    """Yields the employee objects found at `root` while ijson parses fp, each as a dict of its uid/name and
+    the logs whose date string ends in one of `suffixes` (every log when None). Only one employee is held
+    at a time, so memory does not grow with the amount of history. root '' reads a sequence of
+    concatenated top-level documents."""
+    import ijson
+
+    def key(name: str) -> str: return f"{root}.{name}" if root else name
+    logs_item, log_date = key('logs.item'), key('logs.item.date')
+    log_fields = {key('logs.item.time'): 'time', key('logs.item.status'): 'status'}
+    emp_fields = {key('uid'): 'uid', key('name'): 'name'}
+    emp, log = None, None
+    try:
+        # Branches are ordered by how often their events occur: a log is six events at logs_item and one per field
+        for prefix, event, value in ijson.parse(fp, use_float=True, multiple_values=not root):
+            if prefix == logs_item:
+                if event == 'map_key': continue
+                if event == 'start_map': log = {}
+                elif event == 'end_map':
+                    if log is not None and (suffixes is None or 'date' in log): emp['logs'].append(log)
+                    log = None
+            elif log is not None:
+                if prefix == log_date:
+                    # Mongoose writes the date first, so an out-of-month log is dropped before its other fields are read
+                    if suffixes is None or isinstance(value, str) and value[value.find('/'):] in suffixes: log['date'] = value
+                    else: log = None
+                elif prefix in log_fields:
+                    log[log_fields[prefix]] = value
+            elif prefix == root:
+                if event == 'start_map': emp = {'logs': []}
+                elif event == 'end_map': yield emp
+            elif prefix in emp_fields:
+                emp[emp_fields[prefix]] = value
+    except ijson.JSONError as e:
+        raise ValueError(f"invalid JSON: {e}") from e
+
+def process_payload_stream(fp, dates: List[datetime]) -> List[EmployeeMonth]:
+    """Same result as process_payload(json.load(fp), dates), but parses the body incrementally with ijson,
+    keeping only the logs whose date string ends in one of the month's '/mm/yyyy' suffixes."""
+    employees, emp_idx, date_strs, time_strs, statuses = [], [], [], [], []
+    for emp in stream_employees(fp, month_date_suffixes(dates)):
+        for log in emp.pop('logs'):
+            emp_idx.append(len(employees))
+            date_strs.append(log.get('date'))
+            time_strs.append(log.get('time'))
+            statuses.append(log.get('status'))
+        employees.append(emp)
+    return attendance_records(employees, log_table_from_columns(emp_idx, date_strs, time_strs, statuses, dates), dates)
+
+def map_financial_data(records: List[EmployeeMonth]) -> List[EmployeeMonth]:
     """Maps the static financial data (salaries, allowances, etc.) to each employee."""
-    if df.empty: return df
-    
-    def map_data(data_dict):
-        return [data_dict.get(str(id), data_dict.get('default', 0)) for id in df['No.']]
-
-    df['monthly_salary'] = map_data(EMPLOYEE_MONTHLY_SALARIES)
-    df['allowance'] = map_data(EMPLOYEE_ALLOWANCES)
-    df['advance_paid'] = map_data(EMPLOYEE_ADVANCES)
-    df['loan'] = map_data(EMPLOYEE_LOANS)
-    df['premium'] = map_data(EMPLOYEE_PREMIUMS)
-    
-    return df
+    def map_data(data_dict, uid):
+        return data_dict.get(str(uid), data_dict.get('default', 0))
+
+    for rec in records:
+        rec.monthly_salary = map_data(EMPLOYEE_MONTHLY_SALARIES, rec.uid)
+        rec.allowance = map_data(EMPLOYEE_ALLOWANCES, rec.uid)
+        rec.advance_paid = map_data(EMPLOYEE_ADVANCES, rec.uid)
+        rec.loan = map_data(EMPLOYEE_LOANS, rec.uid)
+        rec.premium = map_data(EMPLOYEE_PREMIUMS, rec.uid)
+    return records
+
+def compute_minutes(check_ins: np.ndarray, check_outs: np.ndarray, dates: List[datetime]) -> np.ndarray:
+    """Evaluates the rules of minutes_formula for a whole (employees x days) matrix at once."""
+    FULL_DAY_MINUTES = FULL_DAY_HOURS * 60
+    with np.errstate(invalid="ignore"):
+        actual = np.round((check_outs - check_ins) / 60, 2)
+        worked = ~np.isnan(actual) & (check_outs >= check_ins)
+        weekday_mins = np.where((actual < FULL_DAY_MINUTES) & (FULL_DAY_MINUTES - actual <= RELIEF_MINUTES), FULL_DAY_MINUTES, actual)
+        sunday_mins = np.where(actual >= FULL_DAY_MINUTES / 2, FULL_DAY_MINUTES, actual)
+    is_sunday = np.array([dt.weekday() == 6 for dt in dates], dtype=bool)
+    return np.where(worked, np.where(is_sunday, sunday_mins, weekday_mins), 0.0)
+
+def compute_payroll(records: List[EmployeeMonth], dates: List[datetime]) -> List[EmployeeMonth]:
+    """Computes in Python what the Financial Summary / Deductions formulas would evaluate to.
+    Expects map_financial_data to have run; fills in the per-day 'minutes' and every metric."""
+    if not records: return records
+    check_ins, check_outs = attendance_matrix(records, len(dates))
+    minutes = compute_minutes(check_ins, check_outs, dates)
+    num_dates = len(dates)
+
+    def column(field: str) -> np.ndarray:
+        return np.array([getattr(rec, field) for rec in records])
+
+    salary, allowance = column('monthly_salary'), column('allowance')
+    presence = (minutes > 0).sum(axis=1)
+    per_day_amt = salary / num_dates
+    per_min_wage = salary / (num_dates * FULL_DAY_HOURS * 60)
+    total_mins = minutes.sum(axis=1)
+    gross_salary = presence * per_day_amt
+    short_hour_deduct = (presence * FULL_DAY_HOURS * 60 - total_mins) * per_min_wage
+    short_hour_deduct = np.where(short_hour_deduct < 0, 0, short_hour_deduct)
+    earned_salary = gross_salary - short_hour_deduct
+    total_deductions = column('advance_paid') + column('loan') + column('premium')
+    metrics = {
+        'presence': presence, 'absence': num_dates - presence, 'total_days': np.full(len(records), num_dates),
+        'payable_days': presence, 'per_day_amt': per_day_amt, 'per_min_wage': per_min_wage, 'total_mins': total_mins,
+        'gross_salary': gross_salary, 'short_hour_deduct': short_hour_deduct, 'earned_salary': earned_salary,
+        'total_deductions': total_deductions, 'in_hand_salary': earned_salary + allowance - total_deductions,
+    }
+    for name, values in metrics.items():
+        for rec, value in zip(records, values.tolist()): setattr(rec, name, value)
+    for rec, row in zip(records, minutes): rec.minutes = row
+    return records
+
+def attendance_matrix(records: List[EmployeeMonth], num_days: int) -> (np.ndarray, np.ndarray):
+    """Stacks the per-employee day arrays into (employees x days) check-in / check-out matrices."""
+    if not records: return np.empty((0, num_days)), np.empty((0, num_days))
+    return np.vstack([rec.check_ins for rec in records]), np.vstack([rec.check_outs for rec in records])
+
+def secs_to_time(secs: float):
+    """Converts seconds since midnight back to a time object, or "-" when there was no punch."""
+    if np.isnan(secs): return "-"
+    secs = int(secs)
+    return time(secs // 3600, secs % 3600 // 60, secs % 60)
+
+# --- Daily Aggregate Store ---
+STORE_VERSION = 3 # Bump when STORE_SCHEMA changes; an older store is dropped and rebuilt from the next payload
+STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS employees (uid TEXT NOT NULL, month TEXT NOT NULL, logs_hash TEXT NOT NULL, PRIMARY KEY (uid, month));
+CREATE TABLE IF NOT EXISTS days (uid TEXT NOT NULL, date TEXT NOT NULL, logs_hash TEXT NOT NULL, first_in REAL,
+                                 last_out REAL, PRIMARY KEY (uid, date));
+CREATE INDEX IF NOT EXISTS days_by_date ON days (date);
+"""
+
+def store_path(url: str) -> str:
+    return os.path.join(CACHE_DIR, hashlib.sha256(url.encode()).hexdigest()[:32] + STORE_SUFFIX)
+
+def open_daily_store(path: str) -> "sqlite3.Connection":
+    import sqlite3
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path)
+    if conn.execute("PRAGMA user_version").fetchone()[0] != STORE_VERSION:
+        conn.executescript(f"DROP TABLE IF EXISTS employees; DROP TABLE IF EXISTS days; PRAGMA user_version = {STORE_VERSION};")
+    conn.executescript(STORE_SCHEMA)
+    return conn
+
+def month_date_strings(dates: List[datetime]) -> Dict[str, str]:
+    """Every d/m/yyyy spelling (zero-padded or not) of each of `dates`, mapped to its ISO date. Checking a
+    log against this is a single lookup, which matters when filtering a multi-year history."""
+    return {f"{d}/{m}/{dt.year}": f"{dt:%Y-%m-%d}" for dt in dates
+            for d in (dt.day, f"{dt.day:02d}") for m in (dt.month, f"{dt.month:02d}")}
+
+def logs_hash(logs: List[Dict[str, Any]]) -> str:
+    """Hash of the fields of `logs` that the daily aggregates depend on."""
+    return hashlib.sha1("\n".join(f"{log.get('date')}\t{log.get('time')}\t{log.get('status')}" for log in logs).encode()).hexdigest()
+
+def store_keys(employees: List[Dict[str, Any]]) -> List[str]:
+    """Store key of each employee: the uid, with '#n' appended to repeats so they stay separate rows as in process_payload."""
+    seen, keys = {}, []
+    for emp in employees:
+        uid = str(emp.get('uid', 'N/A'))
+        seen[uid] = seen.get(uid, -1) + 1
+        keys.append(uid if not seen[uid] else f"{uid}#{seen[uid]}")
+    return keys
+
+def update_daily_store(conn: "sqlite3.Connection", payload: Dict[str, Any], dates: List[datetime]) -> (int, int, int):
+    """Brings the per-(uid, date) first check-in / last check-out rows of the month of `dates` in line with
+    the payload. Logs are not append-only (PUT /employees/:uid/logs replaces a day's logs), so each employee's
+    month of logs is hashed: an employee whose hash is unchanged costs a lookup, and for the others only the
+    days whose own hash changed are parsed and aggregated again, from all of that day's logs. Rows of days
+    that no longer have logs are deleted.
+    Returns (logs parsed, days updated, days removed)."""
+    month, first, last = f"{dates[0]:%Y-%m}", f"{dates[0]:%Y-%m-%d}", f"{dates[-1]:%Y-%m-%d}"
+    day_of = month_date_strings(dates)
+    stored = dict(conn.execute("SELECT uid, logs_hash FROM employees WHERE month = ?", (month,)))
+    emp_rows, changed, removed, current = [], [], [], {}
+    employees = payload.get('data', [])
+    for uid, emp in zip(store_keys(employees), employees):
+        logs = [log for log in emp.get('logs', []) if log.get('date') in day_of]
+        emp_hash = logs_hash(logs)
+        if stored.get(uid) == emp_hash: continue
+        emp_rows.append((uid, month, emp_hash))
+
+        days = {}
+        for log in logs: days.setdefault(day_of[log['date']], []).append(log)
+        stored_days = dict(conn.execute("SELECT date, logs_hash FROM days WHERE uid = ? AND date BETWEEN ? AND ?", (uid, first, last)))
+        for day, day_logs in days.items():
+            day_hash = logs_hash(day_logs)
+            if stored_days.get(day) != day_hash:
+                changed.append((uid, day, day_hash))
+                current[uid, day] = day_logs
+        removed.extend((uid, day) for day in stored_days.keys() - days.keys())
+
+    first_in, last_out, time_strs, statuses, owners = {}, {}, [], [], []
+    for key, day_logs in current.items():
+        for log in day_logs:
+            owners.append(key)
+            time_strs.append(log.get('time'))
+            statuses.append(log.get('status'))
+    _, secs = parse_log_columns([], time_strs)
+    for key, sec, status in zip(owners, secs.tolist(), statuses):
+        if np.isnan(sec): continue
+        if status == CHECK_IN: first_in[key] = min(first_in.get(key, sec), sec)
+        elif status == CHECK_OUT: last_out[key] = max(last_out.get(key, sec), sec)
+
+    with conn:
+        conn.executemany("DELETE FROM days WHERE uid = ? AND date = ?", removed)
+        conn.executemany("INSERT OR REPLACE INTO days VALUES (?, ?, ?, ?, ?)",
+                         [(uid, day, day_hash, first_in.get((uid, day)), last_out.get((uid, day))) for uid, day, day_hash in changed])
+        conn.executemany("INSERT OR REPLACE INTO employees VALUES (?, ?, ?)", emp_rows)
+    return len(owners), len(changed), len(removed)
+
+def store_attendance_records(conn: "sqlite3.Connection", employees: List[Dict[str, Any]], dates: List[datetime]) -> List[EmployeeMonth]:
+    """Same records process_payload would build for `employees`, read from the stored daily rows."""
+    first_in = np.full((len(employees), len(dates)), np.nan)
+    last_out = np.full((len(employees), len(dates)), np.nan)
+    if employees and dates:
+        row_of = {uid: i for i, uid in enumerate(store_keys(employees))}
+        rows = conn.execute("SELECT uid, date, first_in, last_out FROM days WHERE date BETWEEN ? AND ?",
+                            (f"{dates[0]:%Y-%m-%d}", f"{dates[-1]:%Y-%m-%d}"))
+        for uid, day, ci, co in rows:
+            if uid not in row_of: continue
+            j = (datetime.fromisoformat(day) - dates[0]).days
+            first_in[row_of[uid], j] = np.nan if ci is None else ci
+            last_out[row_of[uid], j] = np.nan if co is None else co
+    return employee_records(employees, first_in, last_out)
+
+def refresh_attendance_data(url: str, dates: List[datetime], use_cache: bool = True, offline: bool = False) -> List[EmployeeMonth]:
+    """process_payload(fetch_attendance_data(...)), except that only the days whose logs changed since the
+    previous refresh are parsed and aggregated; every other day comes from the store."""
+    payload = fetch_attendance_data(url, use_cache, offline)
+    with closing(open_daily_store(store_path(url))) as conn:
+        parsed_logs, changed_days, removed_days = update_daily_store(conn, payload, dates)
+        print(f"🗃️ [Store] {changed_days} days changed ({parsed_logs} punches re-read)"
+              + (f", {removed_days} days removed." if removed_days else "."))
+        PROFILE.count(**payload_counts(payload), parsed_logs=parsed_logs, changed_days=changed_days)
+        return store_attendance_records(conn, payload.get('data', []), dates)
 
 # --- Excel Sheet Creation ---
-def style_cell(cell, font: Font, alignment: Alignment, fill: Optional[PatternFill] = None, border: Optional[Border] = None):
-    cell.font, cell.alignment = font, alignment
-    if fill: cell.fill = fill
-    if border: cell.border = border
+def register_report_styles(wb: "openpyxl.Workbook"):
+    from openpyxl.styles import NamedStyle
+    for name, (font, alignment, fill, border, number_format) in report_styles().items():
+        style = NamedStyle(name=name, font=font, alignment=alignment, number_format=number_format or "General")
+        if fill: style.fill = fill
+        if border: style.border = border
+        wb.add_named_style(style)
+
+def report_header_cells(month_name: str, year: int) -> List[tuple]:
+    """(merged range, value, style) for the title banner."""
+    return [
+        ("A1:F2", f"{COMPANY_NAME}\n{REPORT_TITLE} - {month_name} {year}", "Report Title"),
+        ("G1:J2", f"Report Generated:\n{datetime.now().strftime('%Y-%m-%d %H:%M')}", "Report Subtitle"),
+    ]
 
 def create_report_header(ws, month_name: str, year: int):
-    ws.merge_cells("A1:F2")
-    ws["A1"].value = f"{COMPANY_NAME}\n{REPORT_TITLE} - {month_name} {year}"
-    style_cell(ws["A1"], HEADER_FONT, CENTER_ALIGN, HEADER_FILL)
-    ws.merge_cells("G1:J2")
-    ws["G1"].value = f"Report Generated:\n{datetime.now().strftime('%Y-%m-%d %H:%M')}"
-    style_cell(ws["G1"], SUBTITLE_FONT, CENTER_ALIGN, HEADER_FILL)
-
-def create_table_headers(ws, df: pd.DataFrame):
+    for cell_range, value, style in report_header_cells(month_name, year):
+        ws.merge_cells(cell_range)
+        top_left = ws[cell_range.split(":")[0]]
+        top_left.value, top_left.style = value, style
+
+def create_table_headers(ws, records: List[EmployeeMonth]):
     ws.merge_cells("A4:A5"), ws.merge_cells("B4:B5")
     ws["A4"].value, ws["B4"].value = "Date", "Status"
-    style_cell(ws["A4"], TABLE_HEADER_FONT, CENTER_ALIGN, SUBHEADER_FILL, THIN_BORDER)
-    style_cell(ws["B4"], TABLE_HEADER_FONT, CENTER_ALIGN, SUBHEADER_FILL, THIN_BORDER)
-    if df.empty: return
-    for i, (_, emp_row) in enumerate(df.iterrows()):
+    ws["A4"].style = ws["B4"].style = "Table Header"
+    if not records: return
+    for i, emp_row in enumerate(records):
         col = 3 + i
-        ws.cell(row=4, column=col, value=emp_row["No."])
-        ws.cell(row=5, column=col, value=emp_row["Name"])
-        style_cell(ws.cell(row=4, column=col), TABLE_HEADER_FONT, CENTER_ALIGN, SUBHEADER_FILL, THIN_BORDER)
-        style_cell(ws.cell(row=5, column=col), TABLE_HEADER_FONT, CENTER_ALIGN, SUBHEADER_FILL, THIN_BORDER)
+        ws.cell(row=4, column=col, value=emp_row.uid).style = "Table Header"
+        ws.cell(row=5, column=col, value=emp_row.name).style = "Table Header"
+
+DAY_ROW_LABELS = [("Check-In", "Check-In Label"), ("Check-Out", "Check-Out Label"), ("Minutes Worked", "Minutes Label")]
+
+def day_style(dt: datetime, today: date) -> str:
+    """Style of a date cell: Sundays and today are highlighted."""
+    if dt.weekday() == 6: return "Sunday Date"
+    if dt.date() == today: return "Today Date"
+    return "Date"
+
+def data_style(name: str, j: int) -> str:
+    """Picks the shaded variant of a daily data style for every other employee column."""
+    return f"{name} Alt" if j % 2 != 0 else name
 
 # ---
 # --- THIS IS THE UPDATED FUNCTION ---
 # ---
-def populate_attendance_data(ws, df: pd.DataFrame, dates: List[datetime], today: date):
+def populate_attendance_data(ws, records: List[EmployeeMonth], dates: List[datetime], today: date, values: bool = False):
     start_row = 6
-    FULL_DAY_MINUTES = FULL_DAY_HOURS * 60
-    RELIEF_MINUTES = 30
+    check_ins, check_outs = attendance_matrix(records, len(dates))
     
     for i, dt in enumerate(dates):
         row_ci, row_co, row_mins = start_row + (i * 3), start_row + (i * 3) + 1, start_row + (i * 3) + 2
         
-        is_sunday, is_today = dt.weekday() == 6, dt.date() == today
-        day_fill, date_font = (SUNDAY_FILL, SUNDAY_DATE_FONT) if is_sunday else ((TODAY_FILL, TODAY_DATE_FONT) if is_today else (None, DATA_FONT))
+        is_sunday, date_style = dt.weekday() == 6, day_style(dt, today)
 
         ws.merge_cells(start_row=row_ci, start_column=1, end_row=row_mins, end_column=1)
         ws.cell(row_ci, 1, f"{dt.strftime('%a')}\n{dt.day}")
-        for r in range(row_ci, row_mins + 1): style_cell(ws.cell(r, 1), date_font, CENTER_ALIGN, day_fill, THIN_BORDER)
+        for r in range(row_ci, row_mins + 1): ws.cell(r, 1).style = date_style
         
-        ws.cell(row_ci, 2, "Check-In"), ws.cell(row_co, 2, "Check-Out"), ws.cell(row_mins, 2, "Minutes Worked")
-        style_cell(ws.cell(row_ci, 2), CI_FONT, CENTER_ALIGN, CI_HEADER_FILL, THIN_BORDER)
-        style_cell(ws.cell(row_co, 2), CO_FONT, CENTER_ALIGN, CO_HEADER_FILL, THIN_BORDER)
-        style_cell(ws.cell(row_mins, 2), MINS_FONT, CENTER_ALIGN, MINS_HEADER_FILL, THIN_BORDER)
+        for r, (label, style) in zip((row_ci, row_co, row_mins), DAY_ROW_LABELS):
+            ws.cell(r, 2, label).style = style
 
-        if df.empty: continue
-        for j, (_, emp_row) in enumerate(df.iterrows()):
+        if not records: continue
+        for j in range(len(records)):
             col = 3 + j
-            
-            # --- MODIFIED BLOCK: Parse time strings into time objects ---
-            
-            logs = emp_row.get(dt.date(), [])
-            
-            # Note: The time format from your API is likely "%I:%M:%S %p" (e.g., 09:57:55 am)
-            # We must convert this string to a real time object for Excel.
-            time_format = "%I:%M:%S %p"  
-            checkins_dt = []
-            checkouts_dt = []
-            
-            for l in logs:
-                try:
-                    # Parse the time string into a datetime.time object
-                    time_str = l['time'].lower().strip() # Clean up string
-                    time_obj = datetime.strptime(time_str, time_format).time()
-                    if l['status'] == "Check-IN":
-                        checkins_dt.append(time_obj)
-                    elif l['status'] == "Check-OUT":
-                        checkouts_dt.append(time_obj)
-                except (ValueError, KeyError):
-                    continue  # Skip logs with bad time format or missing keys
-
-            # Now find the min/max of the actual time objects, not strings
-            ci_val = min(checkins_dt) if checkins_dt else "-"
-            co_val = max(checkouts_dt) if checkouts_dt else "-"
-            
+            # Earliest check-in / latest check-out were precomputed by process_payload
+            ci_val, co_val = secs_to_time(check_ins[j, i]), secs_to_time(check_outs[j, i])
             ci_cell, co_cell = ws.cell(row_ci, col, ci_val), ws.cell(row_co, col, co_val)
             
-            # When writing a time object, explicitly set the number format
-            if isinstance(ci_val, time):
-                ci_cell.number_format = 'h:mm:ss AM/PM'
-            if isinstance(co_val, time):
-                co_cell.number_format = 'h:mm:ss AM/PM'
+            # Time objects get the time-formatted variant of the style
+            ci_cell.style = data_style("CI Time" if isinstance(ci_val, time) else "CI Data", j)
+            co_cell.style = data_style("CO Time" if isinstance(co_val, time) else "CO Data", j)
                 
             ci_ref, co_ref = ci_cell.coordinate, co_cell.coordinate
-
-            # --- END OF MODIFIED BLOCK ---
-
-            actual_minutes_formula = f'ROUND(({co_ref}-{ci_ref})*1440,2)'
-            
-            # This formula is now correct and will work with the numeric time values
-            minutes_formula = (
-                f'=IF(OR({ci_ref}="-",{co_ref}="-",{co_ref}<{ci_ref}), 0, '
-                f'LET(ActualMins, {actual_minutes_formula}, ExpectedMins, {FULL_DAY_MINUTES}, '
-                f'IF(ActualMins >= ExpectedMins, ActualMins, '
-                f'LET(Shortfall, ExpectedMins - ActualMins, '
-                f'IF(Shortfall <= {RELIEF_MINUTES}, ExpectedMins, ActualMins)'
-                f'))))'
-            )
-
-            if is_sunday:
-                half_day_minutes = FULL_DAY_MINUTES / 2
-                minutes_formula = (f'=IF(OR({ci_ref}="-",{co_ref}="-",{co_ref}<{ci_ref}),0,'
-                                 f'IF({actual_minutes_formula}>={half_day_minutes},{FULL_DAY_MINUTES},{actual_minutes_formula}))')
-            
-            mins_cell = ws.cell(row_mins, col, minutes_formula)
-            mins_cell.number_format = '#,##0.00'
-            
-            col_fill = ALT_COL_FILL if j % 2 != 0 else None
-            style_cell(ci_cell, CI_DATA_FONT, CENTER_ALIGN, col_fill, THIN_BORDER)
-            style_cell(co_cell, CO_DATA_FONT, CENTER_ALIGN, col_fill, THIN_BORDER)
-            style_cell(mins_cell, DATA_FONT, CENTER_ALIGN, col_fill, THIN_BORDER)
+            mins = records[j].minutes[i] if values else minutes_formula(ci_ref, co_ref, is_sunday)
+            ws.cell(row_mins, col, mins).style = data_style("Minutes Data", j)
             
         ws.row_dimensions[row_ci].height, ws.row_dimensions[row_co].height, ws.row_dimensions[row_mins].height = 20, 20, 20
 
 
-def create_pivoted_summary(ws, df: pd.DataFrame, month_dates: List[datetime], start_col: int):
-    start_row = 4
-    ws.cell(start_row, start_col, "Financial Summary")
-    style_cell(ws.cell(start_row, start_col), HEADER_FONT, CENTER_ALIGN, FINANCIAL_HEADER_FILL)
-    ws.merge_cells(start_row=start_row, start_column=start_col, end_row=start_row, end_column=start_col + len(df))
+SUMMARY_HEADERS = ["ID", "Name", "Presence", "Absence", "Basic Salary", "Total Days", "Payable Days", "Per Day Amt",
+                   "Per Min Wage", "Total Mins", "Gross Salary", "Short Hour Deduct.", "Earned Salary", "In Hand Salary"]
+DEDUCTIONS_HEADERS = ["ID", "Name", "Allowance", "Advance Paid", "Loan", "Premium", "Total Deductions"]
+SUMMARY_START_ROW = DEDUCTIONS_START_ROW = 4
+
+def minutes_formula(ci_ref: str, co_ref: str, is_sunday: bool) -> str:
+    """Excel formula for the 'Minutes Worked' cell of one employee/day."""
+    FULL_DAY_MINUTES = FULL_DAY_HOURS * 60
+    actual_minutes_formula = f'ROUND(({co_ref}-{ci_ref})*1440,2)'
+
+    if is_sunday:
+        half_day_minutes = FULL_DAY_MINUTES / 2
+        return (f'=IF(OR({ci_ref}="-",{co_ref}="-",{co_ref}<{ci_ref}),0,'
+                f'IF({actual_minutes_formula}>={half_day_minutes},{FULL_DAY_MINUTES},{actual_minutes_formula}))')
+
+    # This formula is now correct and will work with the numeric time values
+    return (
+        f'=IF(OR({ci_ref}="-",{co_ref}="-",{co_ref}<{ci_ref}), 0, '
+        f'LET(ActualMins, {actual_minutes_formula}, ExpectedMins, {FULL_DAY_MINUTES}, '
+        f'IF(ActualMins >= ExpectedMins, ActualMins, '
+        f'LET(Shortfall, ExpectedMins - ActualMins, '
+        f'IF(Shortfall <= {RELIEF_MINUTES}, ExpectedMins, ActualMins)'
+        f'))))'
+    )
+
+def summary_cells(emp_row, i: int, num_emps: int, num_dates: int, start_col: int, values: bool = False) -> List[tuple]:
+    """(value, style) for every metric row of employee i's Financial Summary column.
+    With values=True the numbers precomputed by compute_payroll are written instead of formulas."""
+    if values:
+        return [(emp_row.uid, "Data"), (emp_row.name, "Employee Name")] + [
+            (getattr(emp_row, metric), style) for metric, style in VALUE_METRICS
+        ]
+
+    start_row = SUMMARY_START_ROW
+    current_col = start_col + 1 + i
+
+    # --- Formula Generation ---
+    from openpyxl.utils import get_column_letter
+    main_table_col_letter = get_column_letter(3 + i)
+    full_range = f"{main_table_col_letter}6:{main_table_col_letter}{5 + (num_dates * 3)}"
+    start_cell_full_range = f"{main_table_col_letter}6"
+
+    # Helper to get current column's cell coordinates
+    def cc(row_idx): return get_column_letter(current_col) + str(start_row + 2 + row_idx)
+
+    deductions_table_start_col = start_col + num_emps + 2
+    allowance_ref = get_column_letter(deductions_table_start_col + 2) + str(start_row + 3 + i)
+    deductions_total_ref = get_column_letter(deductions_table_start_col + 6) + str(start_row + 3 + i)
+
+    return [
+        (emp_row.uid, "Data"), # ID
+        (emp_row.name, "Employee Name"), # Name
+        (f'=SUMPRODUCT(--(MOD(ROW({full_range})-ROW({start_cell_full_range}),3)=2),--({full_range}>0))', "Data"), # Presence
+        (f"={cc(5)}-{cc(2)}", "Data"), # Absence
+        (emp_row.monthly_salary, "Amount"), # Basic Salary
+        (num_dates, "Data"), # Total Days
+        (f"={cc(2)}", "Data"), # Payable Days
+        (f"=IF({cc(5)}>0,{cc(4)}/{cc(5)},0)", "Amount"), # Per Day Amt
+        (f"=IF({cc(5)}>0,{cc(4)}/({cc(5)}*{FULL_DAY_HOURS}*60),0)", "Wage"), # Per Min Wage
+        (f'=SUMPRODUCT(--(MOD(ROW({full_range})-ROW({start_cell_full_range}),3)=2),{full_range})', "Minutes"), # Total Mins
+        (f"={cc(7)}*{cc(6)}", "Amount"), # Gross Salary
+        (f"=MAX(0, ({cc(6)}*{FULL_DAY_HOURS}*60 - {cc(9)})*{cc(8)})", "Amount"), # Short Hour Deduct.
+        (f"={cc(10)}-{cc(11)}", "Amount"), # Earned Salary
+        (f"={cc(12)}+{allowance_ref}-{deductions_total_ref}", "In Hand Salary"), # In Hand Salary
+    ]
+
+# compute_payroll columns behind the Financial Summary rows after ID and Name
+VALUE_METRICS = [("presence", "Data"), ("absence", "Data"), ("monthly_salary", "Amount"), ("total_days", "Data"),
+                 ("payable_days", "Data"), ("per_day_amt", "Amount"), ("per_min_wage", "Wage"), ("total_mins", "Minutes"),
+                 ("gross_salary", "Amount"), ("short_hour_deduct", "Amount"), ("earned_salary", "Amount"),
+                 ("in_hand_salary", "In Hand Salary")]
+
+def summary_header_style(header: str) -> str:
+    # Special styling for the 'In Hand Salary' header
+    return "In Hand Salary Header" if header == "In Hand Salary" else "Summary Header"
+
+def deduction_cells(emp_row, r: int, start_col: int, values: bool = False) -> List[tuple]:
+    """(value, style) for employee emp_row's row r of the Deductions table."""
+    from openpyxl.utils import get_column_letter
+    c1 = get_column_letter(start_col + 3)
+    c2 = get_column_letter(start_col + 5)
+    return [
+        (emp_row.uid, "Data"),
+        (emp_row.name, "Data"),
+        (emp_row.allowance, "Amount"),
+        (emp_row.advance_paid, "Amount"),
+        (emp_row.loan, "Amount"),
+        (emp_row.premium, "Amount"),
+        (emp_row.total_deductions if values else f"=SUM({c1}{r}:{c2}{r})", "Amount"),
+    ]
+
+def create_pivoted_summary(ws, records: List[EmployeeMonth], month_dates: List[datetime], start_col: int, values: bool = False):
+    start_row = SUMMARY_START_ROW
+    ws.cell(start_row, start_col, "Financial Summary").style = "Financial Title"
+    ws.merge_cells(start_row=start_row, start_column=start_col, end_row=start_row, end_column=start_col + len(records))
 
     # Row Headers (Metrics)
-    headers = ["ID", "Name", "Presence", "Absence", "Basic Salary", "Total Days", "Payable Days", "Per Day Amt",
-               "Per Min Wage", "Total Mins", "Gross Salary", "Short Hour Deduct.", "Earned Salary", "In Hand Salary"]
-    for i, h in enumerate(headers):
-        cell = ws.cell(row=start_row + 2 + i, column=start_col)
-        cell.value = h
-        # Special styling for the 'In Hand Salary' header
-        if h == "In Hand Salary":
-            style_cell(cell, IN_HAND_SALARY_HEADER_FONT, Alignment(horizontal="right"), IN_HAND_SALARY_FILL, THIN_BORDER)
-        else:
-            style_cell(cell, TABLE_HEADER_FONT, Alignment(horizontal="right"), SUBHEADER_FILL, THIN_BORDER)
-
-    if df.empty: return
+    for i, h in enumerate(SUMMARY_HEADERS):
+        ws.cell(row=start_row + 2 + i, column=start_col, value=h).style = summary_header_style(h)
+
+    if not records: return
 
     num_dates = len(month_dates)
     
     # Column Headers (Employees) and Data
-    for i, (_, emp_row) in enumerate(df.iterrows()):
+    for i, emp_row in enumerate(records):
         current_col = start_col + 1 + i
-        
-        # --- Formula Generation ---
-        main_table_col_letter = get_column_letter(3 + i)
-        full_range = f"{main_table_col_letter}6:{main_table_col_letter}{5 + (num_dates * 3)}"
-        start_cell_full_range = f"{main_table_col_letter}6"
-        
-        # Helper to get current column's cell coordinates
-        def cc(row_idx): return get_column_letter(current_col) + str(start_row + 2 + row_idx)
-
-        # Static Data (ID & Name) are handled in the styling loop below
-        
-        # Formulas
-        ws.cell(row=start_row + 4, column=current_col, value=f'=SUMPRODUCT(--(MOD(ROW({full_range})-ROW({start_cell_full_range}),3)=2),--({full_range}>0))') # Presence
-        ws.cell(row=start_row + 5, column=current_col, value=f"={cc(5)}-{cc(2)}") # Absence
-        ws.cell(row=start_row + 6, column=current_col, value=emp_row['monthly_salary']).number_format = '"₹"#,##0.00'
-        ws.cell(row=start_row + 7, column=current_col, value=num_dates) # Total Days
-        ws.cell(row=start_row + 8, column=current_col, value=f"={cc(2)}") # Payable Days
-        ws.cell(row=start_row + 9, column=current_col, value=f"=IF({cc(5)}>0,{cc(4)}/{cc(5)},0)").number_format = '"₹"#,##0.00'
-        ws.cell(row=start_row + 10, column=current_col, value=f"=IF({cc(5)}>0,{cc(4)}/({cc(5)}*{FULL_DAY_HOURS}*60),0)").number_format = '"₹"#,##0.0000'
-        ws.cell(row=start_row + 11, column=current_col, value=f'=SUMPRODUCT(--(MOD(ROW({full_range})-ROW({start_cell_full_range}),3)=2),{full_range})').number_format = '#,##0.00'
-        ws.cell(row=start_row + 12, column=current_col, value=f"={cc(7)}*{cc(6)}").number_format = '"₹"#,##0.00'
-        ws.cell(row=start_row + 13, column=current_col, value=f"=MAX(0, ({cc(6)}*{FULL_DAY_HOURS}*60 - {cc(9)})*{cc(8)})").number_format = '"₹"#,##0.00'
-        ws.cell(row=start_row + 14, column=current_col, value=f"={cc(10)}-{cc(11)}").number_format = '"₹"#,##0.00'
-        
-        deductions_table_start_col = start_col + len(df) + 2  
-        allowance_ref = get_column_letter(deductions_table_start_col + 2) + str(start_row + 3 + i)
-        deductions_total_ref = get_column_letter(deductions_table_start_col + 6) + str(start_row + 3 + i)
-        ws.cell(row=start_row + 15, column=current_col, value=f"={cc(12)}+{allowance_ref}-{deductions_total_ref}").number_format = '"₹"#,##0.00'
-
-        # --- Styling Loop ---
-        for r_idx in range(2, 16): # Loop through all metric rows
-            cell = ws.cell(row=start_row + r_idx, column=current_col)
-            fill = None # Default to no fill
-            
-            # Static data for ID and Name
-            if r_idx == 2: cell.value = emp_row["No."]
-            if r_idx == 3: 
-                cell.value = emp_row["Name"]
-                fill = NAME_CELL_FILL
-            
-            # Special fill for In Hand Salary
-            if r_idx == 15:
-                fill = IN_HAND_SALARY_FILL
-
-            style_cell(cell, DATA_FONT, CENTER_ALIGN, fill, THIN_BORDER)
+        for r_idx, (value, style) in enumerate(summary_cells(emp_row, i, len(records), num_dates, start_col, values), start=2):
+            ws.cell(row=start_row + r_idx, column=current_col, value=value).style = style
 
 
-def create_deductions_table(ws, df: pd.DataFrame, start_col: int):
-    start_row = 4
-    ws.cell(start_row, start_col, "Allowances & Deductions")
-    style_cell(ws.cell(start_row, start_col), HEADER_FONT, CENTER_ALIGN, DEDUCTIONS_HEADER_FILL)
+def create_deductions_table(ws, records: List[EmployeeMonth], start_col: int, values: bool = False):
+    start_row = DEDUCTIONS_START_ROW
+    ws.cell(start_row, start_col, "Allowances & Deductions").style = "Deductions Title"
     ws.merge_cells(start_row=start_row, start_column=start_col, end_row=start_row, end_column=start_col + 6)
     
-    headers = ["ID", "Name", "Allowance", "Advance Paid", "Loan", "Premium", "Total Deductions"]
     header_row = start_row + 2
-    for i, h in enumerate(headers):
-        style_cell(ws.cell(header_row, start_col + i, h), TABLE_HEADER_FONT, CENTER_ALIGN, SUBHEADER_FILL, THIN_BORDER)
+    for i, h in enumerate(DEDUCTIONS_HEADERS):
+        ws.cell(header_row, start_col + i, h).style = "Table Header"
 
-    if df.empty: return
+    if not records: return
     top_data_row = header_row + 1
-    for i, (_, emp_row) in enumerate(df.iterrows()):
+    for i, emp_row in enumerate(records):
         r = top_data_row + i
-        ws.cell(r, start_col + 0, emp_row['No.'])
-        ws.cell(r, start_col + 1, emp_row['Name'])
-        ws.cell(r, start_col + 2, emp_row['allowance']).number_format = '"₹"#,##0.00'
-        ws.cell(r, start_col + 3, emp_row['advance_paid']).number_format = '"₹"#,##0.00'
-        ws.cell(r, start_col + 4, emp_row['loan']).number_format = '"₹"#,##0.00'
-        ws.cell(r, start_col + 5, emp_row['premium']).number_format = '"₹"#,##0.00'
-        
-        c1 = get_column_letter(start_col + 3)
-        c2 = get_column_letter(start_col + 5)
-        ws.cell(r, start_col + 6, f"=SUM({c1}{r}:{c2}{r})").number_format = '"₹"#,##0.00'
-
-        for c_idx in range(7):
-            style_cell(ws.cell(r, start_col + c_idx), DATA_FONT, CENTER_ALIGN, None, THIN_BORDER)
+        for c_idx, (value, style) in enumerate(deduction_cells(emp_row, r, start_col, values)):
+            ws.cell(r, start_col + c_idx, value).style = style
 
 def finalize_styles(ws, num_main_cols: int):
+    from openpyxl.utils import get_column_letter
     # Main table
     ws.column_dimensions['A'].width, ws.column_dimensions['B'].width = 10, 15
     for i in range(3, num_main_cols + 1):
@@ -368,6 +1070,829 @@ def finalize_styles(ws, num_main_cols: int):
     ws.freeze_panes = get_column_letter(3) + "6"
     ws.sheet_view.show_grid_lines = False
 
+def report_layout(records: List[EmployeeMonth]) -> (int, int, int):
+    """Column positions of the main table end, the Financial Summary and the Deductions table."""
+    num_main_cols = 2 + len(records) if records else 2
+    summary_start_col = num_main_cols + 2 # Add a gap column
+    deductions_start_col = summary_start_col + len(records) + 2 if records else summary_start_col + 2
+    return num_main_cols, summary_start_col, deductions_start_col
+
+def build_workbook(records: List[EmployeeMonth], month_dates: List[datetime], month_name: str, year: int, today_date: date,
+                   values: bool = False) -> "openpyxl.Workbook":
+    from openpyxl import Workbook
+    wb = Workbook()
+    register_report_styles(wb)
+    ws = wb.active
+    ws.title = f"Attendance {month_name} {year}"
+    
+    create_report_header(ws, month_name, year)
+    create_table_headers(ws, records)
+    
+    num_main_cols, summary_start_col, deductions_start_col = report_layout(records)
+    create_pivoted_summary(ws, records, month_dates, summary_start_col, values)
+    create_deductions_table(ws, records, deductions_start_col, values)
+    
+    populate_attendance_data(ws, records, month_dates, today_date, values)
+
+    finalize_styles(ws, num_main_cols)
+    PROFILE.tally_cells(cell.value for cell in ws._cells.values())
+    return wb
+
+# --- Streaming Workbook (write-only mode) ---
+def stream_cell(ws, value, style: str) -> "openpyxl.cell.WriteOnlyCell":
+    from openpyxl.cell import WriteOnlyCell
+    cell = WriteOnlyCell(ws, value)
+    cell.style = style
+    return cell
+
+def append_row(ws, row: list):
+    PROFILE.tally_cells(cell.value for cell in row if cell is not None)
+    ws.append(row)
+
+def build_streaming_workbook(records: List[EmployeeMonth], month_dates: List[datetime], month_name: str, year: int, today_date: date,
+                             values: bool = False) -> "openpyxl.Workbook":
+    """Same layout as build_workbook, but rows are emitted in order into a write-only sheet,
+    so no cell objects are kept around until save."""
+    from openpyxl import Workbook
+    from openpyxl.utils import get_column_letter
+    from openpyxl.worksheet.cell_range import CellRange
+    wb = Workbook(write_only=True)
+    register_report_styles(wb)
+    ws = wb.create_sheet(f"Attendance {month_name} {year}")
+    num_emps, num_dates = len(records), len(month_dates)
+    num_main_cols, summary_start_col, deductions_start_col = report_layout(records)
+    last_day_row = 5 + num_dates * 3
+    check_ins, check_outs = attendance_matrix(records, num_dates)
+
+    # Merged ranges, column widths, row heights and panes must be declared before the first row
+    header_cells = report_header_cells(month_name, year)
+    for cell_range, _, _ in header_cells: ws.merged_cells.add(cell_range)
+    ws.merged_cells.add("A4:A5"), ws.merged_cells.add("B4:B5")
+    ws.merged_cells.add(CellRange(min_row=SUMMARY_START_ROW, min_col=summary_start_col, max_row=SUMMARY_START_ROW, max_col=summary_start_col + num_emps))
+    ws.merged_cells.add(CellRange(min_row=DEDUCTIONS_START_ROW, min_col=deductions_start_col, max_row=DEDUCTIONS_START_ROW, max_col=deductions_start_col + 6))
+    for i in range(num_dates):
+        ws.merged_cells.add(CellRange(min_row=6 + i * 3, min_col=1, max_row=8 + i * 3, max_col=1))
+    for r in range(6, last_day_row + 1): ws.row_dimensions[r].height = 20
+    finalize_styles(ws, num_main_cols)
+
+    # Rows 1-3: title banner
+    (_, title, title_style), (_, generated, generated_style) = header_cells
+    append_row(ws, [stream_cell(ws, title, title_style)] + [None] * 5 + [stream_cell(ws, generated, generated_style)])
+    ws.append([]), ws.append([])
+
+    # Rows 4-5: employee headers and the titles of the two side tables
+    row_4 = [stream_cell(ws, h, "Table Header") for h in ("Date", "Status")]
+    row_4 += [stream_cell(ws, rec.uid, "Table Header") for rec in records]
+    row_4 += [None] * (summary_start_col - len(row_4) - 1)
+    row_4 += [stream_cell(ws, "Financial Summary", "Financial Title")]
+    row_4 += [None] * (deductions_start_col - len(row_4) - 1)
+    row_4 += [stream_cell(ws, "Allowances & Deductions", "Deductions Title")]
+    append_row(ws, row_4)
+    append_row(ws, [None, None] + [stream_cell(ws, rec.name, "Table Header") for rec in records])
+
+    # Rows 6+: 3-row-per-day block on the left, summary and deductions rows on the right
+    last_row = max(last_day_row, SUMMARY_START_ROW + 1 + len(SUMMARY_HEADERS), DEDUCTIONS_START_ROW + 2 + num_emps)
+    col_letters = [get_column_letter(3 + j) for j in range(num_emps)]
+    # Each employee's summary column, built once and written out one metric row at a time
+    summary_columns = [summary_cells(rec, i, num_emps, num_dates, summary_start_col, values) for i, rec in enumerate(records)]
+    for r in range(6, last_row + 1):
+        row = [None] * (deductions_start_col + 6)
+
+        if r <= last_day_row:
+            i, kind = divmod(r - 6, 3)
+            dt = month_dates[i]
+            label, label_style = DAY_ROW_LABELS[kind]
+            row[0] = stream_cell(ws, f"{dt.strftime('%a')}\n{dt.day}" if kind == 0 else None, day_style(dt, today_date))
+            row[1] = stream_cell(ws, label, label_style)
+            for j in range(num_emps):
+                if kind == 2:
+                    if values: mins = records[j].minutes[i]
+                    else: mins = minutes_formula(f"{col_letters[j]}{r - 2}", f"{col_letters[j]}{r - 1}", dt.weekday() == 6)
+                    row[2 + j] = stream_cell(ws, mins, data_style("Minutes Data", j))
+                    continue
+                value = secs_to_time((check_ins if kind == 0 else check_outs)[j, i])
+                style = ("CI" if kind == 0 else "CO") + (" Time" if isinstance(value, time) else " Data")
+                row[2 + j] = stream_cell(ws, value, data_style(style, j))
+
+        metric = r - SUMMARY_START_ROW - 2
+        if 0 <= metric < len(SUMMARY_HEADERS):
+            row[summary_start_col - 1] = stream_cell(ws, SUMMARY_HEADERS[metric], summary_header_style(SUMMARY_HEADERS[metric]))
+            for i, column in enumerate(summary_columns):
+                row[summary_start_col + i] = stream_cell(ws, *column[metric])
+
+        emp_idx = r - DEDUCTIONS_START_ROW - 3
+        if emp_idx == -1:
+            for c_idx, h in enumerate(DEDUCTIONS_HEADERS):
+                row[deductions_start_col - 1 + c_idx] = stream_cell(ws, h, "Table Header")
+        elif 0 <= emp_idx < num_emps:
+            for c_idx, (value, style) in enumerate(deduction_cells(records[emp_idx], r, deductions_start_col, values)):
+                row[deductions_start_col - 1 + c_idx] = stream_cell(ws, value, style)
+
+        append_row(ws, row)
+    return wb
+
+# --- Formula Check ---
+FORMULA_TOKEN = re.compile(r'\s*(?:(?P<num>\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)|(?P<str>"(?:[^"]|"")*")'
+                           r'|(?P<ref>\$?[A-Z]{1,3}\$?\d+(?::\$?[A-Z]{1,3}\$?\d+)?)(?![A-Za-z_(])'
+                           r'|(?P<name>[A-Za-z_][A-Za-z0-9_.]*)|(?P<op><=|>=|<>|[-+*/=<>(),]))')
+
+class FormulaEvaluator:
+    """Evaluates the formulas this module writes into a worksheet the way Excel would: references and
+    single-column ranges, arithmetic and comparisons (element-wise over ranges), and IF, OR, LET, ROUND,
+    SUMPRODUCT, MOD, ROW, MAX and SUM. Times are fractions of a day, empty cells are 0, text compares
+    greater than any number and SUMPRODUCT / SUM / MAX skip anything that isn't a number."""
+    def __init__(self, ws):
+        self.ws, self.cache = ws, {}
+
+    def cell(self, coord: str):
+        coord = coord.replace("$", "")
+        if coord not in self.cache:
+            value = self.ws[coord].value
+            if isinstance(value, str) and value.startswith("="): value = self.evaluate(value[1:])
+            elif isinstance(value, time): value = (value.hour * 3600 + value.minute * 60 + value.second) / 86400
+            self.cache[coord] = value
+        return self.cache[coord]
+
+    def evaluate(self, formula: str):
+        tokens, pos = [], 0
+        while formula[pos:].strip():
+            match = FORMULA_TOKEN.match(formula, pos)
+            if not match: raise ValueError(f"can't parse formula at '{formula[pos:]}'")
+            tokens.append((match.lastgroup, match.group(match.lastgroup)))
+            pos = match.end()
+        self.tokens, self.pos = tokens, 0
+        node = self.parse_comparison()
+        if self.pos != len(tokens): raise ValueError(f"unexpected '{tokens[self.pos][1]}' in formula")
+        return self.eval(node, {})
+
+    # Recursive descent over self.tokens into (kind, ...) tuples
+    def peek(self) -> Optional[str]:
+        return self.tokens[self.pos][1] if self.pos < len(self.tokens) else None
+
+    def take(self, expected: Optional[str] = None) -> tuple:
+        kind, text = self.tokens[self.pos]
+        if expected is not None and text != expected: raise ValueError(f"expected '{expected}', got '{text}'")
+        self.pos += 1
+        return kind, text
+
+    def parse_comparison(self):
+        node = self.parse_additive()
+        while self.peek() in ("=", "<>", "<", ">", "<=", ">="):
+            node = ("cmp", self.take()[1], node, self.parse_additive())
+        return node
+
+    def parse_additive(self):
+        node = self.parse_term()
+        while self.peek() in ("+", "-"):
+            node = ("op", self.take()[1], node, self.parse_term())
+        return node
+
+    def parse_term(self):
+        node = self.parse_unary()
+        while self.peek() in ("*", "/"):
+            node = ("op", self.take()[1], node, self.parse_unary())
+        return node
+
+    def parse_unary(self):
+        if self.peek() in ("-", "+"):
+            sign = self.take()[1]
+            return ("neg", self.parse_unary()) if sign == "-" else self.parse_unary()
+        return self.parse_primary()
+
+    def parse_primary(self):
+        kind, text = self.take()
+        if kind == "num": return ("value", float(text))
+        if kind == "str": return ("value", text[1:-1].replace('""', '"'))
+        if kind == "ref": return ("ref", text)
+        if text == "(":
+            node = self.parse_comparison()
+            self.take(")")
+            return node
+        if kind == "name" and self.peek() == "(":
+            self.take("(")
+            args = []
+            while self.peek() != ")":
+                args.append(self.parse_comparison())
+                if self.peek() == ",": self.take(",")
+            self.take(")")
+            return ("call", text.upper(), args)
+        if kind == "name": return ("name", text.upper())
+        raise ValueError(f"unexpected '{text}' in formula")
+
+    # Evaluation; a range evaluates to a list
+    def eval(self, node, env: Dict[str, Any]):
+        kind = node[0]
+        if kind == "value": return node[1]
+        if kind == "name": return env[node[1]]
+        if kind == "ref":
+            if ":" not in node[1]: return self.cell(node[1])
+            from openpyxl.utils.cell import get_column_letter, range_boundaries
+            min_col, min_row, max_col, max_row = range_boundaries(node[1].replace("$", ""))
+            return [self.cell(f"{get_column_letter(col)}{row}") for row in range(min_row, max_row + 1)
+                    for col in range(min_col, max_col + 1)]
+        if kind == "neg": return self.elementwise(lambda x: -self.number(x), self.eval(node[1], env))
+        if kind == "op":
+            ops = {"+": lambda x, y: x + y, "-": lambda x, y: x - y, "*": lambda x, y: x * y, "/": lambda x, y: x / y}
+            apply = ops[node[1]]
+            return self.elementwise(lambda x, y: apply(self.number(x), self.number(y)), self.eval(node[2], env), self.eval(node[3], env))
+        if kind == "cmp": return self.elementwise(lambda x, y: self.compare(node[1], x, y), self.eval(node[2], env), self.eval(node[3], env))
+        return self.call(node[1], node[2], env)
+
+    def call(self, name: str, args: list, env: Dict[str, Any]):
+        if name == "IF":
+            return self.eval(args[1] if self.truth(self.eval(args[0], env)) else args[2], env)
+        if name == "LET":
+            env = dict(env)
+            for i in range(0, len(args) - 1, 2): env[args[i][1]] = self.eval(args[i + 1], env)
+            return self.eval(args[-1], env)
+        values = [self.eval(arg, env) for arg in args]
+        if name == "OR": return any(self.truth(v) for value in values for v in (value if isinstance(value, list) else [value]))
+        if name == "ROUND":
+            x, digits = self.number(values[0]), int(self.number(values[1]))
+            return math.copysign(math.floor(abs(x) * 10 ** digits + 0.5) / 10 ** digits, x)
+        if name == "MOD": return self.elementwise(lambda x, y: self.number(x) % self.number(y), values[0], values[1])
+        if name == "ROW":
+            rows = [int(re.sub(r"\D", "", ref)) for ref in args[0][1].split(":")]
+            return list(range(rows[0], rows[-1] + 1)) if len(rows) == 2 else rows[0]
+        numbers = [v for value in values for v in (value if isinstance(value, list) else [value])
+                   if isinstance(v, (int, float)) and not isinstance(v, bool)]
+        if name == "SUM": return sum(numbers)
+        if name == "MAX": return max(numbers, default=0)
+        if name == "SUMPRODUCT":
+            def numeric(v): return v if isinstance(v, (int, float)) and not isinstance(v, bool) else 0
+            return sum(math.prod(map(numeric, items)) for items in zip(*values))
+        raise ValueError(f"unsupported function {name}")
+
+    @staticmethod
+    def elementwise(fn, *operands):
+        if not any(isinstance(op, list) for op in operands): return fn(*operands)
+        length = max(len(op) for op in operands if isinstance(op, list))
+        return [fn(*(op[i] if isinstance(op, list) else op for op in operands)) for i in range(length)]
+
+    @staticmethod
+    def number(value) -> float:
+        if value is None: return 0
+        if isinstance(value, bool): return int(value)
+        if isinstance(value, (int, float)): return value
+        raise ValueError(f"#VALUE! ({value!r} is not a number)")
+
+    @staticmethod
+    def truth(value) -> bool:
+        return bool(FormulaEvaluator.number(value))
+
+    @staticmethod
+    def compare(op: str, x, y) -> bool:
+        def key(v):  # Excel orders numbers < text < booleans
+            if isinstance(v, bool): return (2, v)
+            if isinstance(v, str): return (1, v.lower())
+            return (0, v or 0)
+        x, y = key("" if x is None and isinstance(y, str) else x), key("" if y is None and isinstance(x, str) else y)
+        return {"=": x == y, "<>": x != y, "<": x < y, ">": x > y, "<=": x <= y, ">=": x >= y}[op]
+
+def check_values_mode(records: List[EmployeeMonth], dates: List[datetime]) -> int:
+    """Builds the report in both modes, evaluates every formula of the formula-mode sheet (FormulaEvaluator)
+    and reports where it disagrees with what values mode wrote into the same cell. Returns the number of
+    mismatches."""
+    month_name, year, today_date = dates[0].strftime("%B"), dates[0].year, datetime.now().date()
+    formulas = build_workbook(records, dates, month_name, year, today_date).active
+    values = build_workbook(records, dates, month_name, year, today_date, values=True).active
+    evaluator = FormulaEvaluator(formulas)
+    mismatches, checked = 0, 0
+    for row in formulas.iter_rows():
+        for cell in row:
+            if not (isinstance(cell.value, str) and cell.value.startswith("=")): continue
+            checked += 1
+            try:
+                expected = evaluator.cell(cell.coordinate)
+            except (ValueError, ArithmeticError) as e:
+                expected = f"error: {e}"
+            actual = values[cell.coordinate].value
+            if isinstance(expected, str) or not np.isclose(expected, actual):
+                mismatches += 1
+                print(f"❌ [Check] {cell.coordinate} {cell.value}: formula={expected} values={actual}")
+
+    print(f"{'✅' if not mismatches else '⚠️'} [Check] {checked - mismatches}/{checked} formulas agree with the values.")
+    return mismatches
+
+# --- Payslips ---
+PAYSLIP_DEDUCTION_COLUMNS = ['allowance', 'advance_paid', 'loan', 'premium', 'total_deductions']
+
+def payslip_filename(out_dir: str, uid, year: int, month: int) -> str:
+    safe_uid = re.sub(r"[^A-Za-z0-9_-]+", "_", str(uid))
+    return os.path.join(out_dir, f"Payslip_{safe_uid}_{year}-{month:02d}.xlsx")
+
+def write_payslip(rec: EmployeeMonth, month_dates: List[datetime], filename: str, today_date: date):
+    """One employee's attendance card: daily CI/CO/minutes followed by the financial summary, as values."""
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    register_report_styles(wb)
+    ws = wb.create_sheet("Payslip")
+    first_day_row = 7
+    summary_title_row = first_day_row + len(month_dates) + 1
+    summary_rows = ([(h, getattr(rec, metric), style) for h, (metric, style) in zip(SUMMARY_HEADERS[2:-1], VALUE_METRICS[:-1])] +
+                    [(h, getattr(rec, column), "Amount") for h, column in zip(DEDUCTIONS_HEADERS[2:], PAYSLIP_DEDUCTION_COLUMNS)] +
+                    [(SUMMARY_HEADERS[-1], rec.in_hand_salary, "In Hand Salary")])
+
+    ws.merged_cells.add("A1:D1")
+    ws.merged_cells.add(f"A{summary_title_row}:D{summary_title_row}")
+    for r in range(summary_title_row + 1, summary_title_row + 1 + len(summary_rows)): ws.merged_cells.add(f"A{r}:C{r}")
+    ws.row_dimensions[1].height = 40
+    ws.column_dimensions['A'].width, ws.column_dimensions['B'].width = 14, 18
+    ws.column_dimensions['C'].width, ws.column_dimensions['D'].width = 18, 18
+    ws.sheet_view.show_grid_lines = False
+
+    month_label = f"{month_dates[0].strftime('%B')} {month_dates[0].year}"
+    ws.append([stream_cell(ws, f"{COMPANY_NAME}\nPayslip - {month_label}", "Report Title")])
+    ws.append([])
+    ws.append([stream_cell(ws, "ID", "Summary Header"), stream_cell(ws, rec.uid, "Data")])
+    ws.append([stream_cell(ws, "Name", "Summary Header"), stream_cell(ws, rec.name, "Employee Name")])
+    ws.append([])
+    ws.append([stream_cell(ws, h, "Table Header") for h in ("Date", "Check-In", "Check-Out", "Minutes Worked")])
+
+    for i, dt in enumerate(month_dates):
+        ci, co = secs_to_time(rec.check_ins[i]), secs_to_time(rec.check_outs[i])
+        ws.append([stream_cell(ws, f"{dt.strftime('%a')} {dt.day}", day_style(dt, today_date)),
+                   stream_cell(ws, ci, "CI Time" if isinstance(ci, time) else "CI Data"),
+                   stream_cell(ws, co, "CO Time" if isinstance(co, time) else "CO Data"),
+                   stream_cell(ws, rec.minutes[i], "Minutes Data")])
+
+    ws.append([])
+    ws.append([stream_cell(ws, "Financial Summary", "Financial Title")])
+    for header, value, style in summary_rows:
+        ws.append([stream_cell(ws, header, summary_header_style(header)), None, None, stream_cell(ws, value, style)])
+    wb.save(filename)
+
+def write_payslips(records: List[EmployeeMonth], month_dates: List[datetime], out_dir: str) -> int:
+    """Process-pool entry point: writes the payslips of one chunk of employees. Returns how many were written."""
+    today_date = datetime.now().date()
+    year, month = month_dates[0].year, month_dates[0].month
+    for rec in records:
+        write_payslip(rec, month_dates, payslip_filename(out_dir, rec.uid, year, month), today_date)
+    return len(records)
+
+def generate_payslips(records: List[EmployeeMonth], month_dates: List[datetime], out_dir: str, jobs: Optional[int] = None) -> int:
+    """Writes one payslip per employee of records that has been through compute_payroll, fanning the
+    employees out over `jobs` worker processes (in-process when jobs == 1)."""
+    if not records: return 0
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1: return write_payslips(records, month_dates, out_dir)
+
+    # A few chunks per worker keeps the pool busy without pickling one task per employee
+    num_chunks = min(len(records), jobs * 4)
+    chunks = [records[i::num_chunks] for i in range(num_chunks)]
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return sum(pool.map(write_payslips, chunks, [month_dates] * num_chunks, [out_dir] * num_chunks))
+
+# --- Data Exports ---
+EXPORT_FORMATS = ["csv", "json", "parquet"]
+PAYROLL_EXPORT_COLUMNS = ['presence', 'absence', 'monthly_salary', 'total_days', 'payable_days', 'per_day_amt', 'per_min_wage',
+                          'total_mins', 'gross_salary', 'short_hour_deduct', 'earned_salary', 'allowance', 'advance_paid',
+                          'loan', 'premium', 'total_deductions', 'in_hand_salary']
+
+def export_tables(records: List[EmployeeMonth], month_dates: List[datetime]) -> Tuple[Tuple[List[str], List[list]], ...]:
+    """(attendance, payroll) tables of records that have been through compute_payroll, each as
+    (columns, rows): one row per employee and day with check-in/out ('HH:MM:SS', None when missing)
+    and minutes, and one row per employee with every Financial Summary / Deductions value."""
+    check_ins, check_outs = attendance_matrix(records, len(month_dates)) if records else ([], [])
+    days = [dt.strftime("%Y-%m-%d") for dt in month_dates]
+
+    def clock(secs: float) -> Optional[str]:
+        if secs != secs: return None  # NaN: no punch that day
+        secs = int(secs)
+        return f"{secs // 3600:02d}:{secs % 3600 // 60:02d}:{secs % 60:02d}"
+
+    attendance = [[rec.uid, rec.name, day, clock(ins[i]), clock(outs[i]), rec.minutes[i]]
+                  for rec, ins, outs in zip(records, check_ins, check_outs) for i, day in enumerate(days)]
+    payroll = [[rec.uid, rec.name] + [getattr(rec, column) for column in PAYROLL_EXPORT_COLUMNS] for rec in records]
+    return ((["uid", "name", "date", "check_in", "check_out", "minutes"], attendance),
+            (["uid", "name"] + PAYROLL_EXPORT_COLUMNS, payroll))
+
+def write_tables(tables: Dict[str, Tuple[List[str], List[list]]], out_dir: str, formats: List[str]) -> List[str]:
+    """Writes each {file stem: (columns, rows)} table in each of `formats` into out_dir. Returns the paths written."""
+    os.makedirs(out_dir, exist_ok=True)
+    paths, formats = [], list(formats)
+    for stem, (columns, rows) in tables.items():
+        for fmt in list(formats):
+            path = os.path.join(out_dir, f"{stem}.{fmt}")
+            if fmt == "csv":
+                with open(path, "w", newline="", encoding="utf-8") as f:
+                    writer = csv.writer(f, lineterminator="\n")
+                    writer.writerow(columns)
+                    writer.writerows(rows)
+            elif fmt == "json":
+                with open(path, "w", encoding="utf-8") as f:
+                    json.dump([dict(zip(columns, row)) for row in rows], f, indent=1)
+            else:
+                try:
+                    import pandas as pd  # Parquet is the one export that needs the dataframe stack
+                    pd.DataFrame(rows, columns=columns).to_parquet(path, index=False)
+                except ImportError:
+                    print("⚠️ [Export] Parquet needs pandas with pyarrow or fastparquet installed; skipping.")
+                    formats.remove(fmt)
+                    continue
+            paths.append(path)
+    return paths
+
+def write_exports(records: List[EmployeeMonth], month_dates: List[datetime], out_dir: str, formats: List[str]) -> List[str]:
+    """Writes the export tables in each of `formats` into out_dir, straight from the records (no workbook).
+    Returns the paths written."""
+    year, month = month_dates[0].year, month_dates[0].month
+    attendance, payroll = export_tables(records, month_dates)
+    return write_tables({f"Attendance_{year}-{month:02d}": attendance, f"Payroll_{year}-{month:02d}": payroll}, out_dir, formats)
+
+def write_report(records: List[EmployeeMonth], month_dates: List[datetime], filename: str, stream: bool = False,
+                 values: bool = False, check: bool = False, payslip_dir: Optional[str] = None,
+                 payslip_jobs: Optional[int] = None, export_formats: Optional[List[str]] = None,
+                 export_dir: str = ".", workbook: bool = True) -> bool:
+    """Computes payroll for the processed records, writes the requested exports, then builds the workbook
+    and saves it (unless `workbook` is False). Returns success."""
+    year, month_name, today_date = month_dates[0].year, month_dates[0].strftime("%B"), datetime.now().date()
+    if not records: print(f"⚠️ No employee data for {month_name} {year}. Report will have headers only.")
+    else:
+        with PROFILE.stage("payroll"):
+            records = compute_payroll(map_financial_data(records), month_dates)
+            PROFILE.count(employees=len(records))
+
+    if check:
+        with PROFILE.stage("check"):
+            if check_values_mode(records, month_dates): return False
+
+    if export_formats:
+        try:
+            with PROFILE.stage("export"):
+                paths = write_exports(records, month_dates, export_dir, export_formats)
+                PROFILE.count(files=len(paths), rows=len(records) * (len(month_dates) + 1))
+        except (IOError, ValueError) as e:
+            print(f"❌ Error writing exports: {e}")
+            return False
+        for path in paths: print(f"✅ Exported '{path}'")
+    if workbook:
+        print(f"Building Excel workbook for {month_name} {year}..." + (" (streaming)" if stream else "") + (" (values)" if values else ""))
+        with PROFILE.stage("build_workbook"):
+            wb = (build_streaming_workbook if stream else build_workbook)(records, month_dates, month_name, year, today_date, values)
+
+    try:
+        if workbook:
+            with PROFILE.stage("save"):
+                wb.save(filename)
+                PROFILE.count(bytes=os.path.getsize(filename))
+            print(f"✅ Report saved as '{filename}'")
+        if payslip_dir:
+            with PROFILE.stage("payslips"):
+                count = generate_payslips(records, month_dates, payslip_dir, payslip_jobs)
+                PROFILE.count(payslips=count)
+            print(f"✅ {count} payslips saved in '{payslip_dir}'")
+        return True
+    except IOError as e:
+        print(f"❌ Error saving file: {e}")
+        return False
+
+# --- Batch Generation ---
+def parse_month_specs(specs: List[str]) -> List[tuple]:
+    """Expands month specs into sorted unique (year, month) pairs. A spec is a period or an inclusive
+    'FROM:TO' range of periods, where a period is 'YYYY-MM', a quarter 'YYYY-Qn', a whole year 'YYYY',
+    or 'ytd' (January of this year up to this month)."""
+    today = datetime.now()
+    months = set()
+    for spec in specs:
+        bounds = []
+        for part in spec.split(":"):
+            part = part.strip().lower()
+            match = re.fullmatch(r"(\d{4})(?:-(\d{1,2})|-q([1-4]))?", part)
+            if len(bounds) == 2 or not (match or part == "ytd") or match and match.group(2) and not 1 <= int(match.group(2)) <= 12:
+                raise argparse.ArgumentTypeError(f"invalid month spec '{spec}' (expected YYYY-MM, YYYY-Qn, YYYY or ytd, "
+                                                 "optionally as a FROM:TO range)")
+            if part == "ytd": first, last = today.year * 12, today.year * 12 + today.month - 1
+            elif match.group(2): first = last = int(match.group(1)) * 12 + int(match.group(2)) - 1
+            elif match.group(3): first, last = int(match.group(1)) * 12 + int(match.group(3)) * 3 - 3, int(match.group(1)) * 12 + int(match.group(3)) * 3 - 1
+            else: first, last = int(match.group(1)) * 12, int(match.group(1)) * 12 + 11
+            bounds.append((first, last))
+        if bounds[0][0] > bounds[-1][1]:
+            raise argparse.ArgumentTypeError(f"invalid month range '{spec}' (FROM is after TO)")
+        months.update(divmod(i, 12) for i in range(bounds[0][0], bounds[-1][1] + 1))
+    return [(year, month + 1) for year, month in sorted(months)]
+
+def split_payload_by_month(payload: Dict[str, Any], months: Optional[List[tuple]] = None) -> Dict[tuple, Dict[str, Any]]:
+    """Splits one payload into a per-month payload for each (year, month) in a single pass over the logs,
+    or for every month that has logs when `months` is None. Every employee appears in every month, as
+    they would in a single-month run."""
+    wanted = set(months) if months is not None else None
+    per_emp, found = [], set()
+    for emp in payload.get('data', []):
+        emp_logs = {}
+        for log in emp.get('logs', []):
+            parts = str(log.get('date', '')).split('/')
+            try:
+                key = (int(parts[2]), int(parts[1]))
+            except (IndexError, ValueError):
+                continue
+            if wanted is None or key in wanted: emp_logs.setdefault(key, []).append(log)
+        found.update(emp_logs)
+        per_emp.append((emp, emp_logs))
+    return {key: {'data': [{"uid": emp.get("uid", "N/A"), "name": emp.get("name", "Unknown"), "logs": emp_logs.get(key, [])}
+                           for emp, emp_logs in per_emp]}
+            for key in (months if months is not None else sorted(found))}
+
+def batch_filename(year: int, month: int) -> str:
+    stem, ext = os.path.splitext(OUTPUT_FILENAME)
+    return f"{stem}_{year}-{month:02d}{ext}"
+
+def generate_month_report(year: int, month: int, payload: Dict[str, Any], filename: str,
+                          stream: bool = False, values: bool = False, payslip_dir: Optional[str] = None,
+                          profile: Optional[Dict[str, Any]] = None, export_formats: Optional[List[str]] = None,
+                          export_dir: str = ".", workbook: bool = True, check: bool = False) -> bool:
+    """Process-pool entry point: builds and saves one month's workbook from its slice of the payload.
+    Payslips are written in-process, since the months themselves already run in parallel. `profile`
+    (RunProfiler.child_settings) makes the worker append its stages, tagged with the month."""
+    month_dates = get_month_dates(year, month)
+    if not month_dates: return False
+    if profile: PROFILE.start(**profile, month=f"{year}-{month:02d}")
+    with PROFILE.stage("parse"):
+        records = process_payload(payload, month_dates)
+        PROFILE.count(**payload_counts(payload))
+    return write_report(records, month_dates, filename, stream, values, check, payslip_dir=payslip_dir, payslip_jobs=1,
+                        export_formats=export_formats, export_dir=export_dir, workbook=workbook)
+
+def run_batch(args: argparse.Namespace, months: List[tuple]):
+    print(f"🚀 Generating {len(months)} monthly reports...")
+    with PROFILE.stage("fetch"):
+        if args.source: payload = read_log_archive(args.source, [dt for key in months for dt in get_month_dates(*key)])
+        else: payload = fetch_attendance_data(args.url, use_cache=args.use_cache, offline=args.offline)
+        if payload is None: return False
+        PROFILE.count(**payload_counts(payload))
+    with PROFILE.stage("split"):
+        split = split_payload_by_month(payload, months)
+    del payload
+
+    from concurrent.futures import ProcessPoolExecutor
+    with PROFILE.stage("reports"), ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = {key: pool.submit(generate_month_report, *key, split.pop(key), batch_filename(*key), args.stream,
+                                    args.mode == "values", args.payslips, PROFILE.child_settings(), args.export,
+                                    args.export_dir, args.workbook, args.check) for key in months}
+        failed = [f"{month:02d}/{year}" for (year, month), future in futures.items() if not future.result()]
+        PROFILE.count(reports=len(months) - len(failed))
+
+    if failed: print(f"\n❌ {len(failed)} report(s) failed: {', '.join(failed)}")
+    else: print(f"\n✅ Success! {len(months)} reports saved.")
+    return not failed
+
+# --- Rollup Reports ---
+# (header, EmployeeMonth field, cell style) of each column a rollup shows per month and for the period
+ROLLUP_METRICS = [("Presence", "presence", "Data"), ("Minutes", "total_mins", "Minutes"),
+                  ("In Hand Salary", "in_hand_salary", "Amount")]
+
+def rollup_records(payload: Dict[str, Any], months: List[tuple]) -> Dict[tuple, List[EmployeeMonth]]:
+    """Every month's records, through compute_payroll, from one pass over the logs: the logs of the whole span
+    from the first to the last month are aggregated into one (employees x days) matrix that each month slices."""
+    month_dates = {key: get_month_dates(*key) for key in months}
+    start, end = month_dates[months[0]][0], month_dates[months[-1]][-1]
+    span = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    employees = payload.get('data', [])
+    first_in, last_out = aggregate_logs(build_log_table(payload, span), len(employees), len(span))
+
+    per_month = {}
+    for key, dates in month_dates.items():
+        days = slice((dates[0] - start).days, (dates[-1] - start).days + 1)
+        records = employee_records(employees, first_in[:, days], last_out[:, days])
+        per_month[key] = compute_payroll(map_financial_data(records), dates)
+    return per_month
+
+def rollup_rows(per_month: Dict[tuple, List[EmployeeMonth]]) -> List[list]:
+    """One row per employee: uid, name, the ROLLUP_METRICS of each month in turn, then their period totals.
+    Every month lists the same employees in the same order, so the months are zipped together."""
+    rows = []
+    for recs in zip(*per_month.values()):
+        monthly = [getattr(rec, field) for rec in recs for _, field, _ in ROLLUP_METRICS]
+        totals = [sum(getattr(rec, field) for rec in recs) for _, field, _ in ROLLUP_METRICS]
+        rows.append([recs[0].uid, recs[0].name] + monthly + totals)
+    return rows
+
+def rollup_export_table(months: List[tuple], rows: List[list]) -> Tuple[List[str], List[list]]:
+    """The rollup in long form: one row per employee and period ('YYYY-MM', then 'total')."""
+    periods = [f"{year}-{month:02d}" for year, month in months] + ["total"]
+    width = len(ROLLUP_METRICS)
+    return (["uid", "name", "period"] + [field for _, field, _ in ROLLUP_METRICS],
+            [row[:2] + [period] + row[2 + k * width:2 + (k + 1) * width] for row in rows for k, period in enumerate(periods)])
+
+def rollup_label(months: List[tuple]) -> str:
+    first, last = (datetime(year, month, 1).strftime("%B %Y") for year, month in (months[0], months[-1]))
+    return first if first == last else f"{first} - {last}"
+
+def rollup_filename(months: List[tuple]) -> str:
+    stem, ext = os.path.splitext(OUTPUT_FILENAME)
+    (y1, m1), (y2, m2) = months[0], months[-1]
+    return f"{stem}_Rollup_{y1}-{m1:02d}_{y2}-{m2:02d}{ext}"
+
+def build_rollup_workbook(months: List[tuple], rows: List[list]) -> "openpyxl.Workbook":
+    """Compact summary sheet, written row by row: one row per employee with a Presence / Minutes / In Hand
+    Salary group per month and for the whole period, and a totals row underneath."""
+    from openpyxl import Workbook
+    from openpyxl.utils import get_column_letter
+    from openpyxl.worksheet.cell_range import CellRange
+    wb = Workbook(write_only=True)
+    register_report_styles(wb)
+    ws = wb.create_sheet("Rollup")
+    width = len(ROLLUP_METRICS)
+    groups = [datetime(year, month, 1).strftime("%b %Y") for year, month in months] + ["Period Total"]
+    num_cols = 2 + width * len(groups)
+
+    ws.merged_cells.add(CellRange(min_row=1, min_col=1, max_row=2, max_col=num_cols))
+    ws.merged_cells.add("A3:A4"), ws.merged_cells.add("B3:B4")
+    for k in range(len(groups)):
+        ws.merged_cells.add(CellRange(min_row=3, min_col=3 + k * width, max_row=3, max_col=2 + (k + 1) * width))
+    ws.column_dimensions['A'].width, ws.column_dimensions['B'].width = 10, 22
+    for col in range(3, num_cols + 1): ws.column_dimensions[get_column_letter(col)].width = 15
+    ws.freeze_panes = "C5"
+    ws.sheet_view.show_grid_lines = False
+
+    title = f"{COMPANY_NAME}\nAttendance & Salary Rollup - {rollup_label(months)}"
+    append_row(ws, [stream_cell(ws, title, "Report Title")])
+    ws.append([])
+    row_3 = [stream_cell(ws, "No.", "Table Header"), stream_cell(ws, "Name", "Table Header")]
+    for group in groups: row_3 += [stream_cell(ws, group, "Table Header")] + [None] * (width - 1)
+    append_row(ws, row_3)
+    append_row(ws, [None, None] + [stream_cell(ws, header, "Table Header") for _ in groups for header, _, _ in ROLLUP_METRICS])
+
+    styles = [style for _ in groups for _, _, style in ROLLUP_METRICS]
+    styles[-1] = "In Hand Salary"
+    for row in rows:
+        append_row(ws, [stream_cell(ws, row[0], "Data"), stream_cell(ws, row[1], "Employee Name")] +
+                   [stream_cell(ws, value, style) for value, style in zip(row[2:], styles)])
+    if rows:
+        totals = [sum(row[col] for row in rows) for col in range(2, num_cols)]
+        append_row(ws, [stream_cell(ws, "Total", "Summary Header"), stream_cell(ws, None, "Summary Header")] +
+                   [stream_cell(ws, value, style) for value, style in zip(totals, styles)])
+    return wb
+
+def run_rollup(args: argparse.Namespace, months: List[tuple]) -> bool:
+    print(f"🚀 Generating a rollup of {len(months)} months ({rollup_label(months)})...")
+    with PROFILE.stage("fetch"):
+        if args.source: payload = read_log_archive(args.source, [dt for key in months for dt in get_month_dates(*key)])
+        else: payload = fetch_attendance_data(args.url, use_cache=args.use_cache, offline=args.offline)
+        if payload is None: return False
+        PROFILE.count(**payload_counts(payload))
+    with PROFILE.stage("rollup"):
+        rows = rollup_rows(rollup_records(payload, months))
+        PROFILE.count(employees=len(rows), months=len(months))
+    del payload
+
+    (y1, m1), (y2, m2) = months[0], months[-1]
+    try:
+        if args.export:
+            with PROFILE.stage("export"):
+                paths = write_tables({f"Rollup_{y1}-{m1:02d}_{y2}-{m2:02d}": rollup_export_table(months, rows)},
+                                     args.export_dir, args.export)
+            for path in paths: print(f"✅ Exported '{path}'")
+        if args.workbook:
+            filename = rollup_filename(months)
+            with PROFILE.stage("build_workbook"):
+                wb = build_rollup_workbook(months, rows)
+            with PROFILE.stage("save"):
+                wb.save(filename)
+                PROFILE.count(bytes=os.path.getsize(filename))
+            print(f"✅ Rollup saved as '{filename}'")
+        return True
+    except (IOError, ValueError) as e:
+        print(f"❌ Error saving rollup: {e}")
+        return False
+
+# --- Report Server ---
+class ReportService:
+    """Long-running state behind --serve: the logs indexed by month, re-fetched in the background, and
+    an LRU of generated workbooks keyed by (month, data hash, mode, today), so a repeat request for
+    unchanged data is a dictionary lookup."""
+    def __init__(self, url: str, use_cache: bool = True, offline: bool = False, stream: bool = False,
+                 cache_size: int = REPORT_CACHE_SIZE, values: bool = False):
+        self.url, self.use_cache, self.offline, self.stream, self.cache_size = url, use_cache, offline, stream, cache_size
+        self.values = values # Mode of a request without ?mode=
+        self.months, self.hashes, self.employees, self.fetched_at = {}, {}, [], None
+        self.reports = OrderedDict()
+        self.lock, self.render_lock = threading.Lock(), threading.Lock()
+
+    def refresh(self):
+        payload = fetch_attendance_data(self.url, use_cache=self.use_cache, offline=self.offline)
+        months = split_payload_by_month(payload)
+        hashes = {key: month_hash(month) for key, month in months.items()}
+        employees = [{"uid": emp.get("uid", "N/A"), "name": emp.get("name", "Unknown"), "logs": []} for emp in payload.get('data', [])]
+        with self.lock:
+            self.months, self.hashes, self.employees = months, hashes, employees
+            self.fetched_at = datetime.now().isoformat(timespec="seconds")
+        print(f"🔄 [Serve] Indexed {len(months)} months for {len(employees)} employees.")
+
+    def refresh_forever(self, interval: float, stop: threading.Event):
+        while not stop.wait(interval):
+            try:
+                self.refresh()
+            except Exception as e:  # keep serving the last good index
+                print(f"❌ [Serve] Background refresh failed: {e}")
+
+    def month(self, year: int, month: int) -> (Dict[str, Any], str):
+        """The month's payload and its data hash; a month without logs still lists every employee."""
+        with self.lock:
+            if (year, month) in self.months: return self.months[(year, month)], self.hashes[(year, month)]
+            payload = {'data': self.employees}
+        return payload, month_hash(payload)
+
+    def report(self, year: int, month: int, values: bool = False) -> (bytes, str):
+        """(xlsx bytes, ETag) of the month's report, generated only on a cache miss."""
+        payload, data_hash = self.month(year, month)
+        key = (year, month, data_hash, values, datetime.now().date())
+        etag = hashlib.sha256(repr(key).encode()).hexdigest()[:32]
+        with self.lock:
+            if key in self.reports:
+                self.reports.move_to_end(key)
+                return self.reports[key], etag
+        with self.render_lock:  # one build at a time; a concurrent request for the same month waits for it
+            with self.lock:
+                if key in self.reports: return self.reports[key], etag
+            body = render_report(payload, get_month_dates(year, month), self.stream, values)
+            with self.lock:
+                self.reports[key] = body
+                while len(self.reports) > self.cache_size: self.reports.popitem(last=False)
+        return body, etag
+
+def month_hash(payload: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+def render_report(payload: Dict[str, Any], month_dates: List[datetime], stream: bool = False, values: bool = False) -> bytes:
+    """The workbook write_report would save for this month's payload, as bytes."""
+    records = process_payload(payload, month_dates)
+    if records: records = compute_payroll(map_financial_data(records), month_dates)
+    month_name, year = month_dates[0].strftime("%B"), month_dates[0].year
+    wb = (build_streaming_workbook if stream else build_workbook)(records, month_dates, month_name, year, datetime.now().date(), values)
+    body = io.BytesIO()
+    wb.save(body)
+    return body.getvalue()
+
+class ReportRequestHandler:
+    """GET /report?year=YYYY&month=M[&mode=values] returns the workbook; GET /health the index state.
+    serve_reports mixes it into http.server's BaseHTTPRequestHandler, so only --serve imports http.server."""
+    def do_GET(self):
+        service, url = self.server.service, urlparse(self.path)
+        if url.path == "/health":
+            with service.lock:
+                status = {"fetched_at": service.fetched_at, "months": len(service.months), "cached_reports": len(service.reports)}
+            return self.send_body(200, json.dumps(status).encode(), "application/json")
+        if url.path != "/report": return self.send_body(404, b"Not found\n", "text/plain")
+
+        query = parse_qs(url.query)
+        try:
+            year, month = int(query["year"][0]), int(query["month"][0])
+            if not (MINYEAR <= year <= MAXYEAR and 1 <= month <= 12): raise ValueError(year, month)
+        except (KeyError, ValueError):
+            return self.send_body(400, b"Expected ?year=YYYY&month=1-12\n", "text/plain")
+        mode = query.get("mode", [None])[0]
+        values = service.values if mode is None else mode == "values"
+
+        try:
+            body, etag = service.report(year, month, values)
+        except Exception as e:  # a failed build must not drop the connection
+            print(f"❌ [Serve] Report {year}-{month:02d} failed: {e}")
+            return self.send_body(500, b"Report generation failed\n", "text/plain")
+        if self.headers.get("If-None-Match") == f'"{etag}"': return self.send_body(304, b"", None, etag)
+        self.send_body(200, body, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", etag,
+                       f"Attendance_Report_{year}-{month:02d}.xlsx")
+
+    def send_body(self, code: int, body: bytes, content_type: Optional[str], etag: Optional[str] = None,
+                  filename: Optional[str] = None):
+        self.send_response(code)
+        if content_type: self.send_header("Content-Type", content_type)
+        if etag: self.send_header("ETag", f'"{etag}"')
+        if filename: self.send_header("Content-Disposition", f'attachment; filename="{filename}"')
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def parse_serve_address(value: str) -> tuple:
+    """'[HOST:]PORT' as (host, port); the host defaults to 127.0.0.1."""
+    host, _, port = value.rpartition(":")
+    if not port.isdigit() or int(port) > 65535:
+        raise argparse.ArgumentTypeError(f"invalid address '{value}' (expected [HOST:]PORT)")
+    return host or "127.0.0.1", int(port)
+
+def serve_reports(args: argparse.Namespace):
+    host, port = args.serve
+    service = ReportService(args.url, args.use_cache, args.offline, args.stream, args.cache_size, args.mode == "values")
+    service.refresh()
+    stop = threading.Event()
+    threading.Thread(target=service.refresh_forever, args=(args.interval, stop), daemon=True).start()
+
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    handler = type("ReportRequestHandler", (ReportRequestHandler, BaseHTTPRequestHandler), {})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.service = service
+    print(f"🚀 Serving reports on http://{host}:{port}/report?year=YYYY&month=M (refresh every {args.interval:g}s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+    return True
+
 # --- Main Execution ---
 def get_user_date_input() -> (Optional[int], Optional[int]):
     today = datetime.now()
@@ -382,45 +1907,115 @@ def get_user_date_input() -> (Optional[int], Optional[int]):
     except ValueError:
         return default_year, default_month
 
-def main():
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=f"{COMPANY_NAME} - {REPORT_TITLE}")
+    parser.add_argument("--stream", action="store_true",
+                        help="Build the workbook with openpyxl write-only sheets (flat memory on large months)")
+    parser.add_argument("--mode", choices=["formulas", "values"], default="formulas",
+                        help="'values' writes minutes and salaries computed in Python instead of Excel formulas")
+    parser.add_argument("--url", default=API_URL, help="Attendance logs endpoint")
+    parser.add_argument("--offline", action="store_true", help="Do not contact the API; reuse the last cached payload")
+    parser.add_argument("--no-cache", dest="use_cache", action="store_false", help="Neither read nor write the payload cache")
+    parser.add_argument("--fetch", choices=["all", "per-employee"], default="all",
+                        help="'per-employee' requests each employee's month of logs concurrently instead of the full history")
+    parser.add_argument("--workers", type=int, default=FETCH_WORKERS, help="Requests in flight with --fetch per-employee")
+    parser.add_argument("--parser", choices=["json", "incremental"], default="json",
+                        help="'incremental' parses the logs response as it streams in (needs ijson), keeping only the month's logs")
+    parser.add_argument("--source", metavar="FILE",
+                        help="Read the logs from a mongoexport dump of the Employee collection (NDJSON or --jsonArray) instead of the API")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Keep per-day results in a local SQLite store and only re-process the days whose logs changed since the last run")
+    parser.add_argument("--check", action="store_true",
+                        help="Verify that the computed values agree with what the formulas evaluate to")
+    parser.add_argument("--months", nargs="+", metavar="PERIOD",
+                        help="Generate these months non-interactively from one fetch, one file per month "
+                             "(YYYY-MM, YYYY-Qn, YYYY or ytd, or a FROM:TO range of those)")
+    parser.add_argument("--rollup", nargs="+", metavar="PERIOD",
+                        help="One summary of presence, minutes and in-hand salary per employee and month, plus period totals, "
+                             "from a single pass over the logs (e.g. ytd, 2025, 2025-Q3, 2025-01:2025-06)")
+    parser.add_argument("--payslips", metavar="DIR", help="Also write one payslip workbook per employee into DIR")
+    parser.add_argument("--export", nargs="+", choices=EXPORT_FORMATS, metavar="FORMAT",
+                        help="Also write the per-day attendance and payroll tables as csv / json / parquet (parquet needs pyarrow)")
+    parser.add_argument("--export-dir", default=".", metavar="DIR", help="Directory for --export files")
+    parser.add_argument("--no-workbook", dest="workbook", action="store_false",
+                        help="Skip building the Excel workbook (e.g. with --export or --payslips)")
+    parser.add_argument("--serve", metavar="[HOST:]PORT", type=parse_serve_address,
+                        help="Run as a local report service: GET /report?year=YYYY&month=M[&mode=formulas|values], "
+                             "where --mode sets the default mode")
+    parser.add_argument("--interval", type=float, default=SERVE_REFRESH_SECONDS, help="Seconds between background refreshes with --serve")
+    parser.add_argument("--cache-size", type=int, default=REPORT_CACHE_SIZE, help="Generated workbooks kept in memory with --serve")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="Worker processes for --months and --payslips")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="Append per-stage wall/CPU time, peak memory and counts to FILE as JSON lines (traces allocations, so runs slower)")
+    parser.add_argument("--cprofile", metavar="FILE", help="Also dump a cProfile of the whole run to FILE (read it with pstats)")
+    args = parser.parse_args(argv)
+    if args.source and (args.refresh or args.serve):
+        parser.error("--source cannot be combined with --refresh or --serve")
+    if args.serve and (args.months or args.rollup or args.export or args.payslips or args.refresh
+                       or args.parser != "json" or args.fetch != "all"):
+        parser.error("--serve cannot be combined with --months, --rollup, --export, --payslips, --refresh, "
+                     "--parser incremental or --fetch per-employee")
+    if (args.months or args.rollup) and (args.refresh or args.parser != "json" or args.fetch != "all"):
+        parser.error("--months and --rollup cannot be combined with --refresh, --parser incremental or --fetch per-employee")
+    if args.refresh and (args.parser != "json" or args.fetch != "all"):
+        parser.error("--refresh cannot be combined with --parser incremental or --fetch per-employee")
+    try:
+        if args.months: args.months = parse_month_specs(args.months)
+        if args.rollup: args.rollup = parse_month_specs(args.rollup)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+    return args
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    if args.profile: PROFILE.start(args.profile, mode=args.mode, stream=args.stream)
+    profiler = None
+    if args.cprofile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    ok = False
+    try:
+        if args.serve: ok = serve_reports(args)
+        elif args.rollup is not None: ok = run_rollup(args, args.rollup)
+        elif args.months is not None: ok = run_batch(args, args.months)
+        else: ok = run_report(args)
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(args.cprofile)
+            print(f"📈 [Profile] cProfile stats saved as '{args.cprofile}'")
+        PROFILE.finish(bool(ok))
+
+def run_report(args: argparse.Namespace) -> bool:
     print("🚀 Starting attendance report generation...")
     year, month = get_user_date_input()
-    if not (year and month): return
+    if not (year and month): return False
     month_dates = get_month_dates(year, month)
-    if not month_dates: return
-    
-    month_name, today_date = month_dates[0].strftime("%B"), datetime.now().date()
-    print(f"Fetching data for {month_name} {year}...")
-    payload = fetch_attendance_data(API_URL)
-    df = process_payload(payload, month_dates)
+    if not month_dates: return False
     
-    if df.empty: print("⚠️ No employee data. Report will have headers only.")
-    else: df = map_financial_data(df)
+    print(f"Fetching data for {month_dates[0].strftime('%B')} {year}...")
+    if args.refresh:
+        with PROFILE.stage("refresh"):
+            records = refresh_attendance_data(args.url, month_dates, use_cache=args.use_cache, offline=args.offline)
+    elif args.parser == "incremental" and args.fetch != "per-employee" and not args.source:
+        with PROFILE.stage("ingest"):
+            records = ingest_attendance_data(args.url, month_dates, use_cache=args.use_cache, offline=args.offline)
+            PROFILE.count(employees=len(records))
+    else:
+        with PROFILE.stage("fetch"):
+            if args.source: payload = read_log_archive(args.source, month_dates)
+            elif args.fetch == "per-employee": payload = fetch_attendance_by_employee(args.url, year, month, args.workers,
+                                                                                   use_cache=args.use_cache, offline=args.offline)
+            else: payload = fetch_attendance_data(args.url, use_cache=args.use_cache, offline=args.offline)
+            if payload is None: return False
+            PROFILE.count(**payload_counts(payload))
+        with PROFILE.stage("parse"):
+            records = process_payload(payload, month_dates)
+        del payload
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = f"Attendance {month_name} {year}"
-    
-    print("Building Excel workbook...")
-    create_report_header(ws, month_name, year)
-    create_table_headers(ws, df)
-    
-    num_main_cols = 2 + len(df) if not df.empty else 2
-    summary_start_col = num_main_cols + 2 # Add a gap column
-    create_pivoted_summary(ws, df, month_dates, summary_start_col)
-
-    deductions_start_col = summary_start_col + len(df) + 2 if not df.empty else summary_start_col + 2
-    create_deductions_table(ws, df, deductions_start_col)
-    
-    populate_attendance_data(ws, df, month_dates, today_date)
-
-    finalize_styles(ws, num_main_cols)
-
-    try:
-        wb.save(OUTPUT_FILENAME)
-        print(f"\n✅ Success! Report saved as '{OUTPUT_FILENAME}'")
-    except IOError as e:
-        print(f"\n❌ Error saving file: {e}")
+    return write_report(records, month_dates, OUTPUT_FILENAME, args.stream, args.mode == "values", args.check, args.payslips, args.jobs,
+                        args.export, args.export_dir, args.workbook)
 
 if __name__ == "__main__":
     main()
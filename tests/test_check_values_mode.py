@@ -0,0 +1,47 @@
+"""Formula-mode and values-mode workbooks must agree cell for cell (run.check_values_mode)."""
+from openpyxl import Workbook
+
+import run
+from benchmark import synthetic_payload
+
+
+def month_records(year=2025, month=10, num_employees=12):
+    dates = run.get_month_dates(year, month)
+    payload = synthetic_payload(num_employees, 4, year, month, history_months=1, seed=3)
+    # A few edge cases: a punch-out before the punch-in, a lone check-in, and a short Sunday
+    logs = payload["data"][0]["logs"]
+    logs += [{"date": "2/10/2025", "time": "6:00:00 pm", "status": run.CHECK_IN},
+             {"date": "2/10/2025", "time": "9:00:00 am", "status": run.CHECK_OUT}]
+    payload["data"][1]["logs"] = [{"date": "3/10/2025", "time": "9:00:00 am", "status": run.CHECK_IN}]
+    payload["data"][2]["logs"] = [{"date": "5/10/2025", "time": "9:00:00 am", "status": run.CHECK_IN},
+                                  {"date": "5/10/2025", "time": "11:00:00 am", "status": run.CHECK_OUT}]
+    records = run.compute_payroll(run.map_financial_data(run.process_payload(payload, dates)), dates)
+    return records, dates
+
+
+def test_formulas_agree_with_values():
+    records, dates = month_records()
+    assert run.check_values_mode(records, dates) == 0
+
+
+def test_formula_drift_is_detected(monkeypatch):
+    records, dates = month_records()
+    original = run.minutes_formula
+    # A weekday formula that forgets the relief rule no longer matches compute_minutes
+    monkeypatch.setattr(run, "minutes_formula", lambda ci, co, is_sunday: original(ci, co, is_sunday).replace(
+        f"Shortfall <= {run.RELIEF_MINUTES}", "Shortfall <= 0"))
+    assert run.check_values_mode(records, dates) > 0
+
+
+def test_evaluator_follows_excel_semantics():
+    ws = Workbook().active
+    ws["A1"], ws["A2"], ws["A3"] = "-", 5, 7
+    ws["B1"] = '=IF(OR(A1="-",A2>A3),0,1)'
+    ws["B2"] = "=SUMPRODUCT(--(MOD(ROW(A1:A3)-ROW(A1),2)=1),A1:A3)"
+    ws["B3"] = "=LET(x, ROUND(2.346,2), IF(x >= 2.35, x, -x))"
+    ws["B4"] = "=MAX(0, A2-A3)+SUM(A1:A3)"
+    evaluator = run.FormulaEvaluator(ws)
+    assert evaluator.cell("B1") == 0
+    assert evaluator.cell("B2") == 5
+    assert evaluator.cell("B3") == 2.35
+    assert evaluator.cell("B4") == 12
@@ -0,0 +1,69 @@
+"""The --refresh store must end up with what process_payload computes from the same payload."""
+import copy
+from contextlib import closing
+
+import numpy as np
+
+import run
+from benchmark import synthetic_payload
+
+
+def assert_store_matches(conn, payload, dates):
+    stored = run.store_attendance_records(conn, payload["data"], dates)
+    expected = run.process_payload(payload, dates)
+    for got, want in zip(stored, expected):
+        np.testing.assert_array_equal(got.check_ins, want.check_ins)
+        np.testing.assert_array_equal(got.check_outs, want.check_outs)
+
+
+def test_edited_day_is_recomputed(tmp_path):
+    dates = run.get_month_dates(2025, 10)
+    payload = {"data": [{"uid": "E1", "name": "A", "logs": [
+        {"date": "1/10/2025", "time": "9:00:00 am", "status": run.CHECK_IN},
+        {"date": "1/10/2025", "time": "7:00:00 pm", "status": run.CHECK_OUT},
+        {"date": "2/10/2025", "time": "9:30:00 am", "status": run.CHECK_IN}]}]}
+    with closing(run.open_daily_store(str(tmp_path / "store.sqlite3"))) as conn:
+        run.update_daily_store(conn, payload, dates)
+        # PUT /employees/:uid/logs corrects the check-in: same number of logs, same last log
+        edited = copy.deepcopy(payload)
+        edited["data"][0]["logs"][0]["time"] = "10:00:00 am"
+        assert run.update_daily_store(conn, edited, dates) == (2, 1, 0)
+        assert_store_matches(conn, edited, dates)
+        assert run.store_attendance_records(conn, edited["data"], dates)[0].check_ins[0] == 10 * 3600
+
+        # A day whose logs are all deleted disappears from the store
+        del edited["data"][0]["logs"][2]
+        assert run.update_daily_store(conn, edited, dates) == (0, 0, 1)
+        assert_store_matches(conn, edited, dates)
+
+
+def test_refreshes_match_a_full_parse(tmp_path):
+    dates = run.get_month_dates(2025, 10)
+    full = synthetic_payload(8, 4, 2025, 10, history_months=1, seed=5)
+    partial = copy.deepcopy(full)
+    for emp in partial["data"]:
+        emp["logs"] = emp["logs"][:len(emp["logs"]) // 2]
+    with closing(run.open_daily_store(str(tmp_path / "store.sqlite3"))) as conn:
+        for payload in (partial, full):
+            run.update_daily_store(conn, payload, dates)
+            assert_store_matches(conn, payload, dates)
+        assert run.update_daily_store(conn, full, dates)[1] == 0
+
+
+def test_one_punch_refresh_does_not_revisit_the_history(tmp_path, monkeypatch):
+    dates = run.get_month_dates(2025, 10)
+    payload = synthetic_payload(20, 4, 2025, 10, history_months=12, seed=7)
+    with closing(run.open_daily_store(str(tmp_path / "store.sqlite3"))) as conn:
+        run.update_daily_store(conn, payload, dates)
+        logs = payload["data"][3]["logs"]
+        logs.append({"date": "31/10/2025", "time": "11:30:00 pm", "status": run.CHECK_OUT})
+        day_logs = sum(log["date"] == "31/10/2025" for log in logs)
+
+        hashed = []
+        logs_hash = run.logs_hash
+        monkeypatch.setattr(run, "logs_hash", lambda logs: hashed.append(logs) or logs_hash(logs))
+        assert run.update_daily_store(conn, payload, dates) == (day_logs, 1, 0)
+        # One hash per employee, plus the days of the one employee that changed; nothing before October
+        assert len(hashed) <= len(payload["data"]) + len(dates)
+        assert all(log["date"].endswith("/10/2025") for logs in hashed for log in logs)
+        assert_store_matches(conn, payload, dates)
@@ -0,0 +1,77 @@
+"""fetch_attendance_data's payload cache against a local stand-in for the logs endpoint."""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import run
+
+PAYLOAD = {"success": True, "data": [{"uid": "E1", "name": "A", "logs": [
+    {"date": "1/10/2025", "time": "9:00:00 am", "status": run.CHECK_IN}]}]}
+
+
+class LogsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        if server.status != 200: return self.send_body(server.status, b"")
+        if self.headers.get("If-None-Match") == server.etag: return self.send_body(304, b"")
+        self.send_body(200, json.dumps(server.payload).encode(), server.etag)
+
+    def send_body(self, code, body, etag=None):
+        self.send_response(code)
+        if etag: self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setattr(run, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(run, "FETCH_RETRIES", 0)
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), LogsHandler)
+    httpd.requests, httpd.status, httpd.etag, httpd.payload = [], 200, '"v1"', PAYLOAD
+    threading.Thread(target=httpd.serve_forever, args=(0.05,), daemon=True).start()
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}/api/attendance/logs"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_revalidates_with_etag(server):
+    assert run.fetch_attendance_data(server.url) == PAYLOAD
+    assert "If-None-Match" not in server.requests[0]
+    assert run.fetch_attendance_data(server.url) == PAYLOAD
+    assert server.requests[1]["If-None-Match"] == '"v1"'
+
+
+def test_fresh_body_does_not_read_the_snapshot(server, monkeypatch):
+    run.fetch_attendance_data(server.url)
+    server.etag, server.payload = '"v2"', {"success": True, "data": []}
+    monkeypatch.setattr(run, "load_cached_payload", lambda *args: pytest.fail("stale snapshot was parsed"))
+    assert run.fetch_attendance_data(server.url) == server.payload
+
+
+def test_offline_and_stale_fallback(server):
+    assert run.fetch_attendance_data(server.url, offline=True) == {"data": []}
+    run.fetch_attendance_data(server.url)
+    assert run.fetch_attendance_data(server.url, offline=True) == PAYLOAD
+    assert len(server.requests) == 1
+
+    server.status = 503
+    assert run.fetch_attendance_data(server.url) == PAYLOAD
+    assert run.fetch_attendance_data(server.url, use_cache=False) == {"data": []}
+
+
+def test_unreadable_snapshot_is_fetched_again(server):
+    run.fetch_attendance_data(server.url)
+    body_path = run.cache_paths(server.url, run.generate_auth_token(run.ESP_SECRET, run.SERVER_SECRET))[0]
+    with open(body_path, "w") as f: f.write('{"data": [')
+    assert run.fetch_attendance_data(server.url) == PAYLOAD
+    assert "If-None-Match" not in server.requests[-1]
+    assert run.fetch_attendance_data(server.url) == PAYLOAD